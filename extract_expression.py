@@ -2,8 +2,25 @@ from __future__ import annotations
 import os
 import sys
 import json
-import xml.etree.ElementTree as ET
-from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# Prefer lxml (libxml2) to parse MusicXML; fall back to the standard library.
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
+# Prefer orjson to serialize the JSON-LD; fall back to the standard library.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 
 # ====================================================
@@ -25,11 +42,43 @@ HO_IRI  = "https://github.com/andreamust/HaMSE_Ontology/schema#"
 DCT_IRI = "http://purl.org/dc/terms/"
 RDFS_IRI = "http://www.w3.org/2000/01/rdf-schema#"
 
+# Top-level, non-RDF entry of the JSON-LD document holding pipeline bookkeeping.
+# It is not mapped in @context, so JSON-LD processors (rdflib) ignore it.
+PIPELINE_KEY = "_pipeline"
+
+# Extra iterparse options: with lxml, lift libxml2's size limits for very large scores.
+ITERPARSE_OPTIONS: Dict[str, Any] = {"huge_tree": True} if LXML_AVAILABLE else {}
+
 
 # ====================================================
 # Helpers
 # ====================================================
 
+def write_jsonld(path: str, jsonld_obj: Dict[str, Any]) -> None:
+    """
+    Write a JSON-LD document as UTF-8 JSON indented with 2 spaces.
+
+    Use orjson when installed; fall back to json.dump.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(jsonld_obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Return the BLAKE2b (128-bit) hex digest of a file's bytes.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 def derive_work_ids(xml_path: str) -> Dict[str, str]:
     """
     Derive the local work identifier and compact IRI from the filename.
@@ -44,39 +93,85 @@ def derive_work_ids(xml_path: str) -> Dict[str, str]:
     return {"work_local_id": work_local_id, "work_iri": work_iri}
 
 
-def detect_movements(measures: List[ET.Element]) -> List[Dict[str, int]]:
+def is_movement_start(meas_el: ET.Element) -> bool:
     """
-    Detect movements based on MusicXML <measure> @number.
+    A measure whose MusicXML @number is "1" starts a new movement.
+
+    This is the same rule extract_structure uses to build the movements.
+    """
+    return meas_el.get("number") == "1"
 
-    Strategy:
-      - Every measure whose @number == "1" starts a new movement.
-      - A movement ends right before the next such index, or at the end.
 
-    If no measure with @number == "1" is found, assume a single movement.
+def iter_movement_measures(xml_path: str) -> Iterator[Tuple[int, int, ET.Element]]:
     """
-    start_indices: List[int] = []
+    Stream the <measure> elements of the first <part> of a MusicXML file.
 
-    for i, meas in enumerate(measures):
-        if meas.get("number") == "1":
-            start_indices.append(i)
+    Yields (movement_index, measure_position, measure_element), where
+    measure_position is the 0-based index of the measure inside the part.
 
-    if not start_indices:
-        return [{"movement_index": 1, "start_idx": 0, "end_idx": len(measures)}]
+    Movements are detected on the fly with is_movement_start:
+      - Every measure whose @number == "1" starts a new movement.
+      - Measures before the first such measure are skipped.
+    If no measure with @number == "1" is found, the whole part is a single
+    movement (those measures are buffered until the end of the part).
 
-    start_indices = sorted(start_indices)
-    movements: List[Dict[str, int]] = []
+    Each measure is cleared and detached once the caller has processed it,
+    so memory stays bounded by one measure instead of the whole score.
+    Parsing stops at the end of the first <part>.
+    """
+    part_el = None
+    depth = 0
+    position = 0
+    movement_index = 0
+    # Measures seen before the first @number == "1" (only used if there is none)
+    leading_measures: List[Tuple[int, ET.Element]] = []
+
+    with open(xml_path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end"), **ITERPARSE_OPTIONS):
+            if event == "start":
+                depth += 1
+                if depth == 2 and part_el is None and elem.tag == "part":
+                    part_el = elem
+                continue
+
+            depth -= 1
+            if part_el is None:
+                # Header blocks (work, identification, credit, part-list...) are never read
+                if depth == 1:
+                    elem.clear()
+                continue
+            if elem is part_el:
+                break
+            if depth != 2 or elem.tag != "measure":
+                continue
+
+            meas_el = elem
+            meas_pos = position
+            position += 1
+
+            if is_movement_start(meas_el):
+                movement_index += 1
+                for _, skipped_el in leading_measures:
+                    skipped_el.clear()
+                    part_el.remove(skipped_el)
+                leading_measures = []
+
+            if movement_index == 0:
+                leading_measures.append((meas_pos, meas_el))
+                continue
+
+            yield movement_index, meas_pos, meas_el
+
+            meas_el.clear()
+            part_el.remove(meas_el)
 
-    for idx, start in enumerate(start_indices):
-        movement_index = idx + 1
-        if idx + 1 < len(start_indices):
-            end = start_indices[idx + 1]
-        else:
-            end = len(measures)
-        movements.append(
-            {"movement_index": movement_index, "start_idx": start, "end_idx": end}
-        )
+    if part_el is None:
+        raise ValueError("No <part> element found in MusicXML file.")
+    if position == 0:
+        raise ValueError("No <measure> elements found in the first <part>.")
 
-    return movements
+    for meas_pos, meas_el in leading_measures:
+        yield 1, meas_pos, meas_el
 
 
 def sanitize_measure_number(raw_number: Optional[str], fallback_index: int) -> str:
@@ -91,6 +186,23 @@ def sanitize_measure_number(raw_number: Optional[str], fallback_index: int) -> s
     return "".join(ch if ch.isalnum() else "_" for ch in raw_number)
 
 
+# Zero-padded event index strings, "000001", "000002", ... (grown on demand).
+_EVENT_INDEX_STRS: List[str] = []
+
+
+def format_event_index(index: int) -> str:
+    """
+    Return the 1-based event index as the 6-digit string used in event ids.
+
+    Strings are cached at module level, so every score processed by the same
+    process (e.g. a folder worker) reuses them.
+    """
+    cache = _EVENT_INDEX_STRS
+    while len(cache) < index:
+        cache.append(f"{len(cache) + 1:06d}")
+    return cache[index - 1]
+
+
 def parse_int_or_keep_string(value: Optional[str]):
     """
     Try to parse a string as integer. If it fails, return the original string.
@@ -128,20 +240,77 @@ def append_unique_id_ref(list_value: Any, new_id: str) -> List[Dict[str, str]]:
     return current
 
 
+def add_unique_id_ref(
+    node: Dict[str, Any],
+    prop: str,
+    new_id: str,
+    seen_refs: Dict[Tuple[str, str], set],
+) -> None:
+    """
+    Add {"@id": new_id} to node[prop] without duplicates, in O(1).
+
+    seen_refs maps (node @id, prop) to the set of ids already linked. The first
+    time a (node, prop) pair is touched, the existing value is normalized with
+    append_unique_id_ref and its ids are recorded; later calls only check the set.
+    """
+    key = (node["@id"], prop)
+    seen = seen_refs.get(key)
+    if seen is None:
+        refs = append_unique_id_ref(node.get(prop), new_id)
+        node[prop] = refs
+        seen_refs[key] = {item.get("@id") for item in refs if isinstance(item, dict)}
+        return
+    if new_id not in seen:
+        seen.add(new_id)
+        node[prop].append({"@id": new_id})
+
+
+def ensure_types(
+    node: Dict[str, Any],
+    required: Tuple[str, ...],
+    type_index: Dict[str, set],
+) -> None:
+    """
+    Make sure node["@type"] is a list containing every type in required.
+
+    type_index maps node @id to the set of its types, so membership is O(1);
+    the @type list itself keeps its insertion order.
+    """
+    node_id = node["@id"]
+    seen = type_index.get(node_id)
+    if seen is None:
+        types = node.get("@type", [])
+        if isinstance(types, str):
+            types = [types]
+        node["@type"] = types
+        seen = type_index[node_id] = set(types)
+    else:
+        types = node["@type"]
+    for t in required:
+        if t not in seen:
+            seen.add(t)
+            types.append(t)
+
+
 def strip_ns(tag: str) -> str:
     """
     Strip XML namespace from a tag, returning the local name.
+
+    Comments and processing instructions (kept in the tree by lxml) have a
+    non-string tag; they map to an empty name so that no dispatch matches them.
     """
+    if not isinstance(tag, str):
+        return ""
     if "}" in tag:
         return tag.split("}", 1)[1]
     return tag
 
 
 # Loudness dynamic values we want to consider.
-LOUDNESS_DYNAMIC_VALUES = {
+LOUDNESS_DYNAMIC_VALUES = frozenset({
     "ppp", "pp", "p", "mp", "mf", "f", "ff", "fff",
     "sf", "sfp", "fp", "pf"
-}
+})
 
 # Optional heuristic mapping to a relative dynamic level.
 DYNAMIC_LEVELS: Dict[str, int] = {
@@ -161,6 +330,21 @@ DYNAMIC_LEVELS: Dict[str, int] = {
 }
 
 
+# Base @type tuples of the nodes touched by this script.
+EVENT_TYPES = ("ho:SymbolicEvent", "so:MusicNotationElement")
+DYNAMIC_TYPES = ("mso:Dynamic", "so:ExpressiveElement")
+LOUDNESS_DYNAMIC_TYPES = DYNAMIC_TYPES + ("so:LoudnessDynamic",)
+ARTICULATION_TYPES = ("mso:Articulation", "so:ExpressiveElement")
+
+# MusicXML <articulations> child -> (articulationText, articulationClass).
+# You can extend this mapping if needed.
+ARTICULATION_MAP: Dict[str, Tuple[str, str]] = {
+    "staccato": ("staccato", "so:Staccato"),
+    "accent": ("accent", "so:Accent"),
+    "tenuto": ("tenuto", "so:Tenuto"),
+}
+
+
 def is_loudness_dynamic(value: str) -> bool:
     """
     Check if a dynamic value should be treated as a LoudnessDynamic.
@@ -168,6 +352,26 @@ def is_loudness_dynamic(value: str) -> bool:
     return value.lower() in LOUDNESS_DYNAMIC_VALUES
 
 
+@lru_cache(maxsize=64)
+def classify_dynamic(value: str) -> Tuple[Optional[int], bool]:
+    """
+    Return (dynamicLevel or None, is LoudnessDynamic) for a lowercased dynamic value.
+
+    The vocabulary of dynamics is tiny, so results are memoized.
+    """
+    return DYNAMIC_LEVELS.get(value), is_loudness_dynamic(value)
+
+
+@lru_cache(maxsize=16)
+def articulation_node_types(art_class: Optional[str]) -> Tuple[str, ...]:
+    """
+    Full @type tuple of an articulation node with the given specific class.
+    """
+    if art_class is None:
+        return ARTICULATION_TYPES
+    return ARTICULATION_TYPES + (art_class,)
+
+
 def parse_direction_dynamics(direction_el: ET.Element) -> List[str]:
     """
     Parse <direction> to extract loudness-type dynamics (p, mf, ff, sf, sfp, etc.)
@@ -181,8 +385,12 @@ def parse_direction_dynamics(direction_el: ET.Element) -> List[str]:
     if dyn_parent is None:
         return result
 
-    for child in list(dyn_parent):
-        dyn_name = strip_ns(child.tag).lower()
+    for child in dyn_parent:
+        tag = child.tag
+        if not isinstance(tag, str):
+            continue
+        # Inlined strip_ns: rfind() is -1 for namespaceless tags.
+        dyn_name = tag[tag.rfind("}") + 1:].lower()
         # Typical MusicXML dynamic tags: p, pp, mp, mf, f, ff, sf, sfp, etc.
         if dyn_name in LOUDNESS_DYNAMIC_VALUES:
             result.append(dyn_name)
@@ -190,15 +398,19 @@ def parse_direction_dynamics(direction_el: ET.Element) -> List[str]:
     return result
 
 
-def parse_note_dynamics(note_el: ET.Element) -> List[str]:
+def parse_note_dynamics(
+    note_el: ET.Element, notations: Optional[ET.Element] = None
+) -> List[str]:
     """
     Parse a <note> element for embedded <notations><dynamics>.
 
     This is less common than <direction>-based dynamics, but possible.
+    The note's <notations> element can be passed in if already looked up.
     """
     result: List[str] = []
 
-    notations = note_el.find("notations")
+    if notations is None:
+        notations = note_el.find("notations")
     if notations is None:
         return result
 
@@ -206,40 +418,45 @@ def parse_note_dynamics(note_el: ET.Element) -> List[str]:
     if dyn_parent is None:
         return result
 
-    for child in list(dyn_parent):
-        dyn_name = strip_ns(child.tag).lower()
+    for child in dyn_parent:
+        tag = child.tag
+        if not isinstance(tag, str):
+            continue
+        dyn_name = tag[tag.rfind("}") + 1:].lower()
         if dyn_name in LOUDNESS_DYNAMIC_VALUES:
             result.append(dyn_name)
 
     return result
 
 
-def parse_note_articulations(note_el: ET.Element) -> List[Tuple[str, str]]:
+def parse_note_articulations(
+    note_el: ET.Element, notations: Optional[ET.Element] = None
+) -> List[Tuple[str, str]]:
     """
     Parse a <note> element for articulations under <notations><articulations>,
     and slurs (for legato).
 
     Returns a list of (articulationText, articulationClass) tuples, e.g.:
       [("staccato", "so:Staccato"), ("accent", "so:Accent")]
+    The note's <notations> element can be passed in if already looked up.
     """
     results: List[Tuple[str, str]] = []
 
-    notations = note_el.find("notations")
+    if notations is None:
+        notations = note_el.find("notations")
     if notations is None:
         return results
 
     # Standard Articulations block
     arts_parent = notations.find("articulations")
     if arts_parent is not None:
-        for child in list(arts_parent):
-            art_name = strip_ns(child.tag).lower()
-            if art_name == "staccato":
-                results.append(("staccato", "so:Staccato"))
-            elif art_name == "accent":
-                results.append(("accent", "so:Accent"))
-            elif art_name == "tenuto":
-                results.append(("tenuto", "so:Tenuto"))
-            # You can extend this mapping if needed.
+        for child in arts_parent:
+            tag = child.tag
+            if not isinstance(tag, str):
+                continue
+            hit = ARTICULATION_MAP.get(tag[tag.rfind("}") + 1:].lower())
+            if hit is not None:
+                results.append(hit)
 
     # Slurs: we approximate the start of a slur as a legato articulation.
     for slur_el in notations.findall("slur"):
@@ -258,20 +475,6 @@ def extend_with_expression(xml_path: str) -> Dict[str, Any]:
     ids = derive_work_ids(xml_path)
     work_local_id = ids["work_local_id"]
 
-    # --- Parse MusicXML ---
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-
-    part_el = root.find("./part")
-    if part_el is None:
-        raise ValueError("No <part> element found in MusicXML file.")
-
-    measures = part_el.findall("measure")
-    if not measures:
-        raise ValueError("No <measure> elements found in the first <part>.")
-
-    movements_info = detect_movements(measures)
-
     # --- Load existing unified JSON-LD ---
     try:
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -293,6 +496,13 @@ def extend_with_expression(xml_path: str) -> Dict[str, Any]:
     with open(jsonld_path, "r", encoding="utf-8") as f:
         jsonld_obj = json.load(f)
 
+    # Skip the whole layer if it was already added from this exact MusicXML.
+    # Re-running metadata rewrites the JSON-LD without this marker.
+    source_hash = hash_file(xml_path)
+    pipeline_info = jsonld_obj.get(PIPELINE_KEY)
+    if isinstance(pipeline_info, dict) and pipeline_info.get("expressionSourceHash") == source_hash:
+        return jsonld_obj
+
     # Ensure context
     context = jsonld_obj.get("@context", {})
     context.setdefault("so", SO_IRI)
@@ -307,223 +517,215 @@ def extend_with_expression(xml_path: str) -> Dict[str, Any]:
     graph: List[Dict[str, Any]] = jsonld_obj.get("@graph", [])
 
     # Index nodes by @id
-    node_by_id: Dict[str, Dict[str, Any]] = {}
-    for node in graph:
-        if isinstance(node, dict) and "@id" in node:
-            node_by_id[node["@id"]] = node
+    node_by_id: Dict[str, Dict[str, Any]] = {
+        node["@id"]: node for node in graph if isinstance(node, dict) and "@id" in node
+    }
+    node_by_id_get = node_by_id.get
+    graph_append = graph.append
+
+    # @id -> set of @type values, kept in sync with the nodes' @type lists
+    type_index: Dict[str, set] = {}
 
-    def get_or_create_node(node_id: str, base_types: List[str]) -> Dict[str, Any]:
+    def get_or_create_node(node_id: str, base_types: Tuple[str, ...]) -> Dict[str, Any]:
         """
         Get or create a node with the given @id and ensure it has at least the base_types.
         """
-        node = node_by_id.get(node_id)
+        node = node_by_id_get(node_id)
         if node is None:
             node = {"@id": node_id, "@type": list(base_types)}
-            graph.append(node)
+            graph_append(node)
             node_by_id[node_id] = node
+            type_index[node_id] = set(base_types)
         else:
-            types = node.get("@type", [])
-            if isinstance(types, str):
-                types = [types]
-            for t in base_types:
-                if t not in types:
-                    types.append(t)
-            node["@type"] = types
+            ensure_types(node, base_types, type_index)
         return node
 
     # We must reproduce the same event indexing used in extract_notation:
     # - global_event_counter increases by 1 for each <note> visited,
     #   scanning measures inside each movement in document order.
+    # The MusicXML is streamed measure by measure (see iter_movement_measures).
     global_event_counter = 1
 
     # Local counters to generate unique IDs per event
     event_dynamic_counts: Dict[str, int] = {}
     event_articulation_counts: Dict[str, int] = {}
 
-    for m_info in movements_info:
-        movement_index = m_info["movement_index"]
-        start_idx = m_info["start_idx"]
-        end_idx = m_info["end_idx"]
-
-        for i in range(start_idx, end_idx):
-            meas_el = measures[i]
-            raw_number = meas_el.get("number")
-            sanitized_number = sanitize_measure_number(raw_number, fallback_index=i + 1)
-
-            measure_id = f"so:{work_local_id}_M{movement_index}_Measure_{sanitized_number}"
-
-            # State: dynamics from <direction> that should apply to the next note on each staff.
-            pending_dynamics_by_staff: Dict[int, List[str]] = {}
-
-            # Iterate measure children in document order so that <direction> and <note>
-            # can be interleaved in time, but notes are still visited in the same order
-            # as in extract_notation (one increment of global_event_counter per <note>).
-            for child in list(meas_el):
-                tag_name = strip_ns(child.tag)
-
-                # 1) Direction-based dynamics
-                if tag_name == "direction":
-                    dyn_values = parse_direction_dynamics(child)
-                    if dyn_values:
-                        # Determine staff index; default = 1
-                        staff_index = 1
-                        staff_el = child.find("staff")
-                        if staff_el is not None and staff_el.text:
-                            try:
-                                staff_index = int(staff_el.text.strip())
-                            except ValueError:
-                                pass
-
-                        # Store all dynamic values to apply to the next note on this staff
-                        current = pending_dynamics_by_staff.get(staff_index, [])
-                        current.extend(dyn_values)
-                        pending_dynamics_by_staff[staff_index] = current
-
-                # 2) Notes: create links to existing SymbolicEvents and attach expression
-                elif tag_name == "note":
-                    note_el = child
-
-                    # Staff index (default 1)
+    # Ids already linked through so:hasDynamic / so:hasArticulation, per event
+    seen_refs: Dict[Tuple[str, str], set] = {}
+
+    for movement_index, i, meas_el in iter_movement_measures(xml_path):
+        raw_number = meas_el.get("number")
+        sanitized_number = sanitize_measure_number(raw_number, fallback_index=i + 1)
+
+        measure_id = f"so:{work_local_id}_M{movement_index}_Measure_{sanitized_number}"
+        # Every event id of this measure starts with the same stem
+        event_id_stem = measure_id + "_Event_"
+
+        # State: dynamics from <direction> that should apply to the next note on each staff.
+        pending_dynamics_by_staff: Dict[int, List[str]] = {}
+
+        # Iterate measure children in document order so that <direction> and <note>
+        # can be interleaved in time, but notes are still visited in the same order
+        # as in extract_notation (one increment of global_event_counter per <note>).
+        for child in meas_el:
+            tag_name = child.tag
+            # MusicXML tags are plain strings; only namespaced tags and
+            # comments (lxml) need strip_ns.
+            if tag_name.__class__ is not str or "}" in tag_name:
+                tag_name = strip_ns(tag_name)
+
+            # 1) Direction-based dynamics
+            if tag_name == "direction":
+                dyn_values = parse_direction_dynamics(child)
+                if dyn_values:
+                    # Determine staff index; default = 1
                     staff_index = 1
-                    staff_el = note_el.find("staff")
+                    staff_el = child.find("staff")
                     if staff_el is not None and staff_el.text:
                         try:
                             staff_index = int(staff_el.text.strip())
                         except ValueError:
                             pass
 
-                    # Compute event_id as in extract_notation.py
-                    event_index_str = f"{global_event_counter:06d}"
-                    global_event_counter += 1
-
-                    event_id = (
-                        f"so:{work_local_id}_M{movement_index}_Measure_"
-                        f"{sanitized_number}_Event_{event_index_str}"
-                    )
-
-                    # Get or create the SymbolicEvent node (it should already exist).
-                    event_node = get_or_create_node(
-                        event_id,
-                        base_types=["ho:SymbolicEvent", "so:MusicNotationElement"],
-                    )
-
-                    # --------------------------------------------------
-                    # 2.a Dynamics from pending <direction> on this staff
-                    # --------------------------------------------------
-                    dyn_values_from_direction = pending_dynamics_by_staff.get(staff_index, [])
-                    if dyn_values_from_direction:
-                        # Once we attach them to this note, clear the pending list
-                        pending_dynamics_by_staff[staff_index] = []
-
-                        for dyn_value in dyn_values_from_direction:
-                            dyn_value_lower = dyn_value.lower()
-                            # Determine index for this event to generate a unique ID
-                            dyn_count = event_dynamic_counts.get(event_id, 0) + 1
-                            event_dynamic_counts[event_id] = dyn_count
-
-                            dyn_id = f"{event_id}_Dyn_{dyn_count}"
-
-                            dyn_node = get_or_create_node(
-                                dyn_id,
-                                base_types=["mso:Dynamic", "so:ExpressiveElement"],
-                            )
-                            dyn_node["so:dynamicValue"] = dyn_value_lower
-
-                            # Optional: assign numeric dynamicLevel heuristic
-                            if dyn_value_lower in DYNAMIC_LEVELS:
-                                dyn_node["so:dynamicLevel"] = DYNAMIC_LEVELS[dyn_value_lower]
-
-                            # Mark as LoudnessDynamic if appropriate
-                            if is_loudness_dynamic(dyn_value_lower):
-                                dyn_types = dyn_node.get("@type", [])
-                                if isinstance(dyn_types, str):
-                                    dyn_types = [dyn_types]
-                                if "so:LoudnessDynamic" not in dyn_types:
-                                    dyn_types.append("so:LoudnessDynamic")
-                                dyn_node["@type"] = dyn_types
-
-                            # Link Dynamic <-> SymbolicEvent
-                            dyn_node["so:isDynamicOf"] = {"@id": event_id}
-                            event_node["so:hasDynamic"] = append_unique_id_ref(
-                                event_node.get("so:hasDynamic"), dyn_id
-                            )
-
-                    # --------------------------------------------------
-                    # 2.b Dynamics embedded in this <note> (if any)
-                    # --------------------------------------------------
-                    note_dyn_values = parse_note_dynamics(note_el)
-                    for dyn_value in note_dyn_values:
+                    # Store all dynamic values to apply to the next note on this staff
+                    current = pending_dynamics_by_staff.get(staff_index, [])
+                    current.extend(dyn_values)
+                    pending_dynamics_by_staff[staff_index] = current
+
+            # 2) Notes: create links to existing SymbolicEvents and attach expression
+            elif tag_name == "note":
+                note_el = child
+
+                # Staff index (default 1)
+                staff_index = 1
+                staff_el = note_el.find("staff")
+                if staff_el is not None and staff_el.text:
+                    try:
+                        staff_index = int(staff_el.text.strip())
+                    except ValueError:
+                        pass
+
+                # Compute event_id as in extract_notation.py
+                event_index_str = format_event_index(global_event_counter)
+                global_event_counter += 1
+
+                event_id = event_id_stem + event_index_str
+
+                # Get or create the SymbolicEvent node (it should already exist).
+                event_node = get_or_create_node(
+                    event_id,
+                    base_types=EVENT_TYPES,
+                )
+
+                # --------------------------------------------------
+                # 2.a Dynamics from pending <direction> on this staff
+                # --------------------------------------------------
+                dyn_values_from_direction = pending_dynamics_by_staff.get(staff_index, [])
+                if dyn_values_from_direction:
+                    # Once we attach them to this note, clear the pending list
+                    pending_dynamics_by_staff[staff_index] = []
+
+                    for dyn_value in dyn_values_from_direction:
                         dyn_value_lower = dyn_value.lower()
+                        # Determine index for this event to generate a unique ID
                         dyn_count = event_dynamic_counts.get(event_id, 0) + 1
                         event_dynamic_counts[event_id] = dyn_count
 
-                        dyn_id = f"{event_id}_Dyn_{dyn_count}"
+                        dyn_id = event_id + "_Dyn_" + str(dyn_count)
+
+                        dyn_level, is_loud = classify_dynamic(dyn_value_lower)
 
+                        # Mark as LoudnessDynamic if appropriate
                         dyn_node = get_or_create_node(
                             dyn_id,
-                            base_types=["mso:Dynamic", "so:ExpressiveElement"],
+                            base_types=LOUDNESS_DYNAMIC_TYPES if is_loud else DYNAMIC_TYPES,
                         )
                         dyn_node["so:dynamicValue"] = dyn_value_lower
 
-                        if dyn_value_lower in DYNAMIC_LEVELS:
-                            dyn_node["so:dynamicLevel"] = DYNAMIC_LEVELS[dyn_value_lower]
-
-                        if is_loudness_dynamic(dyn_value_lower):
-                            dyn_types = dyn_node.get("@type", [])
-                            if isinstance(dyn_types, str):
-                                dyn_types = [dyn_types]
-                            if "so:LoudnessDynamic" not in dyn_types:
-                                dyn_types.append("so:LoudnessDynamic")
-                            dyn_node["@type"] = dyn_types
+                        # Optional: assign numeric dynamicLevel heuristic
+                        if dyn_level is not None:
+                            dyn_node["so:dynamicLevel"] = dyn_level
 
+                        # Link Dynamic <-> SymbolicEvent
                         dyn_node["so:isDynamicOf"] = {"@id": event_id}
-                        event_node["so:hasDynamic"] = append_unique_id_ref(
-                            event_node.get("so:hasDynamic"), dyn_id
-                        )
+                        add_unique_id_ref(event_node, "so:hasDynamic", dyn_id, seen_refs)
+
+                # --------------------------------------------------
+                # 2.b Dynamics embedded in this <note> (if any)
+                # --------------------------------------------------
+                # Most notes carry no <notations>: look it up once and skip
+                # both inline parsers (2.b, 2.c) when it is absent.
+                notations_el = note_el.find("notations")
+                note_dyn_values = (
+                    parse_note_dynamics(note_el, notations_el)
+                    if notations_el is not None else ()
+                )
+                for dyn_value in note_dyn_values:
+                    dyn_value_lower = dyn_value.lower()
+                    dyn_count = event_dynamic_counts.get(event_id, 0) + 1
+                    event_dynamic_counts[event_id] = dyn_count
+
+                    dyn_id = event_id + "_Dyn_" + str(dyn_count)
+
+                    dyn_level, is_loud = classify_dynamic(dyn_value_lower)
+
+                    dyn_node = get_or_create_node(
+                        dyn_id,
+                        base_types=LOUDNESS_DYNAMIC_TYPES if is_loud else DYNAMIC_TYPES,
+                    )
+                    dyn_node["so:dynamicValue"] = dyn_value_lower
+
+                    if dyn_level is not None:
+                        dyn_node["so:dynamicLevel"] = dyn_level
+
+                    dyn_node["so:isDynamicOf"] = {"@id": event_id}
+                    add_unique_id_ref(event_node, "so:hasDynamic", dyn_id, seen_refs)
+
+                # --------------------------------------------------
+                # 2.c Articulations for this <note>
+                # --------------------------------------------------
+                articulations = (
+                    parse_note_articulations(note_el, notations_el)
+                    if notations_el is not None else ()
+                )
+                for art_text, art_class in articulations:
+                    art_text_lower = art_text.lower()
+                    art_count = event_articulation_counts.get(event_id, 0) + 1
+                    event_articulation_counts[event_id] = art_count
+
+                    art_id = event_id + "_Art_" + str(art_count)
+
+                    # Specific articulation class if provided (Accent, Staccato, Tenuto, Legato)
+                    art_node = get_or_create_node(
+                        art_id,
+                        base_types=articulation_node_types(art_class),
+                    )
+                    art_node["so:articulationText"] = art_text_lower
 
-                    # --------------------------------------------------
-                    # 2.c Articulations for this <note>
-                    # --------------------------------------------------
-                    articulations = parse_note_articulations(note_el)
-                    for art_text, art_class in articulations:
-                        art_text_lower = art_text.lower()
-                        art_count = event_articulation_counts.get(event_id, 0) + 1
-                        event_articulation_counts[event_id] = art_count
+                    # Link Articulation <-> SymbolicEvent
+                    art_node["so:isArticulationOf"] = {"@id": event_id}
+                    add_unique_id_ref(event_node, "so:hasArticulation", art_id, seen_refs)
 
-                        art_id = f"{event_id}_Art_{art_count}"
+    jsonld_obj["@graph"] = graph
 
-                        art_node = get_or_create_node(
-                            art_id,
-                            base_types=["mso:Articulation", "so:ExpressiveElement"],
-                        )
-                        art_node["so:articulationText"] = art_text_lower
-
-                        # Add specific articulation class if provided (Accent, Staccato, Tenuto, Legato)
-                        if art_class is not None:
-                            art_types = art_node.get("@type", [])
-                            if isinstance(art_types, str):
-                                art_types = [art_types]
-                            if art_class not in art_types:
-                                art_types.append(art_class)
-                            art_node["@type"] = art_types
-
-                        # Link Articulation <-> SymbolicEvent
-                        art_node["so:isArticulationOf"] = {"@id": event_id}
-                        event_node["so:hasArticulation"] = append_unique_id_ref(
-                            event_node.get("so:hasArticulation"), art_id
-                        )
+    if not isinstance(pipeline_info, dict):
+        pipeline_info = {}
+        jsonld_obj[PIPELINE_KEY] = pipeline_info
+    pipeline_info["expressionSourceHash"] = source_hash
 
-    jsonld_obj["@graph"] = graph
     return jsonld_obj
 
 
 # ====================================================
-# Main
+# File / folder processing
 # ====================================================
 
-if __name__ == "__main__":
-    xml_path = MUSICXML_PATH
+def process_xml_file(xml_path: str) -> str:
+    """
+    Add the expression layer (dynamics, articulations) of one MusicXML file to its JSON-LD in JSONLD_DIR.
 
+    Returns the path of the written JSON-LD file.
+    """
     if not os.path.isfile(xml_path):
         raise FileNotFoundError(f"MusicXML file not found: {xml_path}")
 
@@ -540,7 +742,66 @@ if __name__ == "__main__":
     base_name = os.path.splitext(os.path.basename(xml_path))[0]
     output_jsonld_path = os.path.join(output_dir, base_name + ".jsonld")
 
-    with open(output_jsonld_path, "w", encoding="utf-8") as f:
-        json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+    write_jsonld(output_jsonld_path, jsonld_obj)
+
+    return output_jsonld_path
+
+
+def process_xml_folder(xml_dir: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Run process_xml_file on every .xml file found in xml_dir.
+
+    Each score only touches its own JSON-LD file, so files are distributed
+    over a pool of worker processes (max_workers defaults to the number of
+    CPUs). A failing file is reported and skipped; the names of the failed
+    files are returned.
+    """
+    files = sorted(f for f in os.listdir(xml_dir) if f.lower().endswith(".xml"))
+    if not files:
+        print(f"No .xml files found in folder: {xml_dir}")
+        return []
+
+    print(f"Extracting expression for {len(files)} MusicXML files in: {xml_dir}")
+    failed: List[str] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_xml_file, os.path.join(xml_dir, fname)): fname
+            for fname in files
+        }
+        for future in as_completed(futures):
+            fname = futures[future]
+            try:
+                output_jsonld_path = future.result()
+            except Exception as exc:
+                print(f"[ERROR] Expression step failed for {fname}: {exc}")
+                failed.append(fname)
+                continue
+            print(f"JSON-LD written to: {output_jsonld_path}")
+
+    if failed:
+        print(f"[ERROR] {len(failed)} of {len(files)} MusicXML files failed")
+    return sorted(failed)
+
 
-    print(f"JSON-LD written to: {output_jsonld_path}")
+# ====================================================
+# Main
+# ====================================================
+
+if __name__ == "__main__":
+    """
+    Usage:
+
+      python extract_expression.py path/to/score.xml
+        -> updates JSON_LD/score.jsonld
+
+      python extract_expression.py path/to/score_musicxml
+        -> processes every .xml file in the folder, in parallel
+    """
+    xml_path = MUSICXML_PATH
+
+    if os.path.isdir(xml_path):
+        if process_xml_folder(xml_path):
+            sys.exit(1)
+    else:
+        output_jsonld_path = process_xml_file(xml_path)
+        print(f"JSON-LD written to: {output_jsonld_path}")
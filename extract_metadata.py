@@ -2,8 +2,23 @@ from __future__ import annotations
 import os
 import sys
 import json
-import xml.etree.ElementTree as ET
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+# Intentar usar lxml (libxml2) para parsear; si no, ElementTree estándar
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
+# Intentar usar orjson para escribir el JSON-LD; si no, json estándar
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Intentar usar music21 para análisis de tonalidad
 try:
@@ -46,15 +61,103 @@ FIFTHS_TO_MINOR_TONIC = {
     5: "G_sharp", 6: "D_sharp", 7: "A_sharp",
 }
 
+# Parser shared by every MusicXML parse (None -> ElementTree default parser).
+XML_PARSER = ET.XMLParser(huge_tree=True) if LXML_AVAILABLE else None
+
+# Extra iterparse options: with lxml, lift libxml2's size limits for very large scores.
+ITERPARSE_OPTIONS: Dict[str, Any] = {"huge_tree": True} if LXML_AVAILABLE else {}
+
+# ElementPath queries run on the score root, and their XPath equivalents
+# (first match in document order). Compiled once when lxml is available.
+ROOT_QUERIES = {
+    "./work/work-title": "./work/work-title",
+    "credit": "credit",
+    "./identification/creator[@type='composer']": "./identification/creator[@type='composer']",
+    ".//key": "(.//key)[1]",
+    "./part-list/score-part/part-name": "./part-list/score-part/part-name",
+    "./part-list/score-part/score-instrument/instrument-name":
+        "./part-list/score-part/score-instrument/instrument-name",
+}
+COMPILED_ROOT_QUERIES = (
+    {path: ET.XPath(xpath) for path, xpath in ROOT_QUERIES.items()} if LXML_AVAILABLE else {}
+)
+
 
 # ====================================================
 # Parse basic work metadata (title, composer, id)
 # ====================================================
 
-def parse_musicxml_metadata(xml_path: str) -> Dict[str, Any]:
+def parse_musicxml(xml_path: str):
+    """
+    Parse a MusicXML file and return its ElementTree.
+
+    With lxml, a shared parser with huge_tree=True is used so that very large
+    scores are not rejected by libxml2's default size limits.
+    """
+    return ET.parse(xml_path, parser=XML_PARSER)
+
+
+def parse_musicxml_header(xml_path: str, chunk_size: int = 64 * 1024) -> ET.Element:
+    """
+    Parse only the beginning of a MusicXML file and return its (partial) root.
+
+    Everything this script reads comes before the notes: the score header
+    (<work>, <identification>, <credit>, <part-list>) precedes the first
+    <part>, and the global key is the first <key>. The file is fed to a pull
+    parser in chunks and reading stops as soon as the first </key> has been
+    parsed, so the measures after it are never tokenized. Without any <key>
+    the whole file is read, as with parse_musicxml.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"), **ITERPARSE_OPTIONS)
+
+    root = None
+    with open(xml_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if root is None:
+                    root = elem
+                if event == "end" and elem.tag == "key":
+                    return root
+    parser.close()
+    for event, elem in parser.read_events():
+        if root is None:
+            root = elem
+    return root
+
+
+def find_first(root: ET.Element, path: str) -> Optional[ET.Element]:
+    """
+    root.find(path), using the precompiled XPath under lxml.
+    """
+    query = COMPILED_ROOT_QUERIES.get(path)
+    if query is None:
+        return root.find(path)
+    hits = query(root)
+    return hits[0] if hits else None
+
+
+def find_all(root: ET.Element, path: str) -> list:
+    """
+    root.findall(path), using the precompiled XPath under lxml.
+    Only for queries whose XPath is not restricted to the first match ("credit").
+    """
+    query = COMPILED_ROOT_QUERIES.get(path)
+    if query is None:
+        return root.findall(path)
+    return query(root)
+
+
+def parse_musicxml_metadata(xml_path: str, root: Optional[ET.Element] = None) -> Dict[str, Any]:
     """
     Extract basic metadata from a MusicXML file.
 
+    If root is given (the already parsed <score-partwise>), the file is not
+    parsed again.
+
     Returns a dictionary with:
         - work_local_id: local identifier derived from the filename
         - work_compact_iri: compact IRI (CURIE) for the work (e.g., "so:Beethoven_Op002No1-01")
@@ -62,20 +165,20 @@ def parse_musicxml_metadata(xml_path: str) -> Dict[str, Any]:
         - title: work title (if found)
         - composer: composer name (if found)
     """
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
+    if root is None:
+        root = parse_musicxml(xml_path).getroot()
 
     # ---- Title (so:title, domain mo:MusicalWork) ----
     work_title = None
 
     # Prefer <work><work-title>
-    wt = root.find("./work/work-title")
+    wt = find_first(root, "./work/work-title")
     if wt is not None and wt.text:
         work_title = " ".join(wt.text.split())
 
     # Fallback: look into <credit> entries with credit-type "title"
     if not work_title:
-        for credit in root.findall("credit"):
+        for credit in find_all(root, "credit"):
             ctype = credit.find("credit-type")
             cwords = credit.find("credit-words")
             if (
@@ -89,13 +192,13 @@ def parse_musicxml_metadata(xml_path: str) -> Dict[str, Any]:
     composer = None
 
     # Prefer <identification><creator type="composer">
-    creator = root.find("./identification/creator[@type='composer']")
+    creator = find_first(root, "./identification/creator[@type='composer']")
     if creator is not None and creator.text:
         composer = " ".join(creator.text.split())
 
     # Fallback: <credit> entries with credit-type "composer"
     if not composer:
-        for credit in root.findall("credit"):
+        for credit in find_all(root, "credit"):
             ctype = credit.find("credit-type")
             cwords = credit.find("credit-words")
             if (
@@ -124,61 +227,64 @@ def parse_musicxml_metadata(xml_path: str) -> Dict[str, Any]:
 # Extract global key / key signature information
 # ====================================================
 
-def extract_initial_key_info(xml_path: str) -> Dict[str, Any]:
+def extract_initial_key_info(xml_path: str, root: Optional[ET.Element] = None) -> Dict[str, Any]:
     """
     Extrae información de la tonalidad global de la obra.
 
     Estrategia:
-      1. Intentar primero un análisis global con music21 (score.analyze('key')).
-      2. Si falla o no da mayor/menor, caer a la primera etiqueta <key> del MusicXML.
+      1. Leer primero la primera etiqueta <key> del MusicXML (fifths y mode).
+      2. Solo si falta fifths o el mode no es mayor/menor, completar con un
+         análisis global de music21 (score.analyze('key')), que es mucho más
+         costoso porque parsea y analiza toda la partitura.
       3. A partir de fifths y mode, mapear:
          - clase de armadura (so:KS_*),
          - tipo y número de alteraciones,
          - tónica teórica (FIFTHS_TO_MAJOR_TONIC / FIFTHS_TO_MINOR_TONIC),
          - clase de tonalidad (so:Key_F_minor, etc.).
+
+    Si se pasa root (el árbol ya parseado), no se vuelve a parsear el archivo.
     """
     fifths: int | None = None
     mode: str | None = None
 
     # ------------------------------------------------
-    # 1) Intento principal: análisis con music21
+    # 1) Intento principal: la primera etiqueta <key> del MusicXML
     # ------------------------------------------------
-    if MUSIC21_AVAILABLE:
+    if root is None:
+        root = parse_musicxml(xml_path).getroot()
+
+    key_el = find_first(root, ".//key")
+    if key_el is not None:
+        fifths_el = key_el.find("fifths")
+        mode_el = key_el.find("mode")
+
+        if fifths_el is not None and fifths_el.text:
+            try:
+                fifths = int(fifths_el.text.strip())
+            except ValueError:
+                fifths = None
+
+        if mode_el is not None and mode_el.text:
+            mode_raw = mode_el.text.strip()
+            mode = mode_raw.lower() if mode_raw else None
+
+    # ------------------------------------------------
+    # 2) Fallback: análisis con music21 para completar lo que falte
+    # ------------------------------------------------
+    if MUSIC21_AVAILABLE and (fifths is None or mode not in {"major", "minor"}):
         try:
             score = music21.converter.parse(xml_path)
             k = score.analyze("key")  # análisis global de tonalidad
 
             if k is not None:
                 # music21 da el número de sostenidos (negativo = bemoles)
-                fifths = int(k.sharps)
-                if k.mode:
+                if fifths is None:
+                    fifths = int(k.sharps)
+                if mode not in {"major", "minor"} and k.mode:
                     mode = k.mode.lower()  # "major" o "minor"
         except Exception:
-            # Si algo falla, pasamos al fallback MusicXML
-            fifths = None
-            mode = None
-
-    # ------------------------------------------------
-    # 2) Fallback: usar la primera etiqueta <key> del MusicXML
-    # ------------------------------------------------
-    if fifths is None or mode not in {"major", "minor"}:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        key_el = root.find(".//key")
-        if key_el is not None:
-            fifths_el = key_el.find("fifths")
-            mode_el = key_el.find("mode")
-
-            if fifths is None and fifths_el is not None and fifths_el.text:
-                try:
-                    fifths = int(fifths_el.text.strip())
-                except ValueError:
-                    fifths = None
-
-            if mode not in {"major", "minor"} and mode_el is not None and mode_el.text:
-                mode_raw = mode_el.text.strip()
-                mode = mode_raw.lower() if mode_raw else None
+            # Si algo falla, nos quedamos con lo leído del MusicXML
+            pass
 
     # Si aún así no tenemos fifths, no podemos inferir tonalidad / armadura
     if fifths is None:
@@ -238,7 +344,7 @@ def extract_initial_key_info(xml_path: str) -> Dict[str, Any]:
 # Extract instrument information
 # ====================================================
 
-def extract_instrument_info(xml_path: str) -> Dict[str, Any]:
+def extract_instrument_info(xml_path: str, root: Optional[ET.Element] = None) -> Dict[str, Any]:
     """
     Extract instrument information from the MusicXML file.
 
@@ -250,20 +356,22 @@ def extract_instrument_info(xml_path: str) -> Dict[str, Any]:
     Returns a dictionary with:
         - label: human-readable instrument name (string)
         - instrument_class: compact IRI for the ontology class (e.g., "so:Piano")
+
+    If root is given, the file is not parsed again.
     """
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
+    if root is None:
+        root = parse_musicxml(xml_path).getroot()
 
     instrument_label = None
 
     # Try <part-list><score-part><part-name>
-    part_name_el = root.find("./part-list/score-part/part-name")
+    part_name_el = find_first(root, "./part-list/score-part/part-name")
     if part_name_el is not None and part_name_el.text:
         instrument_label = " ".join(part_name_el.text.split())
 
     # Fallback: <score-part><score-instrument><instrument-name>
     if not instrument_label:
-        instr_el = root.find("./part-list/score-part/score-instrument/instrument-name")
+        instr_el = find_first(root, "./part-list/score-part/score-instrument/instrument-name")
         if instr_el is not None and instr_el.text:
             instrument_label = " ".join(instr_el.text.split())
 
@@ -297,9 +405,12 @@ def build_metadata_jsonld(xml_path: str) -> Dict[str, Any]:
       - its global key signature (mto:KeySignature) if a <key> is found, also tagged as so:Metadata
       - its instrument node and so:hasInstrument relation, instrument tagged as so:Metadata
     """
-    meta = parse_musicxml_metadata(xml_path)
-    key_info = extract_initial_key_info(xml_path)
-    instrument_info = extract_instrument_info(xml_path)
+    # Parse the MusicXML header once and share it between the extractors.
+    root = parse_musicxml_header(xml_path)
+
+    meta = parse_musicxml_metadata(xml_path, root=root)
+    key_info = extract_initial_key_info(xml_path, root=root)
+    instrument_info = extract_instrument_info(xml_path, root=root)
 
     work_id = meta["work_compact_iri"]
     work_local_id = meta["work_local_id"]
@@ -387,14 +498,29 @@ def build_metadata_jsonld(xml_path: str) -> Dict[str, Any]:
 
 
 # ====================================================
-# Main
+# File / folder processing
 # ====================================================
 
-if __name__ == "__main__":
-    xml_path = MUSICXML_PATH
-    if len(sys.argv) > 1:
-        xml_path = sys.argv[1]
+def write_jsonld(path: str, jsonld_obj: Dict[str, Any]) -> None:
+    """
+    Write a JSON-LD document as UTF-8 JSON indented with 2 spaces.
 
+    Use orjson when installed; fall back to json.dump.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(jsonld_obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+
+
+def process_xml_file(xml_path: str) -> str:
+    """
+    Build the metadata JSON-LD for one MusicXML file and write it into JSONLD_DIR.
+
+    Returns the path of the written JSON-LD file.
+    """
     if not os.path.isfile(xml_path):
         raise FileNotFoundError(f"MusicXML file not found: {xml_path}")
 
@@ -412,7 +538,69 @@ if __name__ == "__main__":
     # Use the original name with dash: Beethoven_Op002No1-01.jsonld
     output_jsonld_path = os.path.join(output_dir, base_name + ".jsonld")
 
-    with open(output_jsonld_path, "w", encoding="utf-8") as f:
-        json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+    write_jsonld(output_jsonld_path, jsonld_obj)
+
+    return output_jsonld_path
+
+
+def process_xml_folder(xml_dir: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Run process_xml_file on every .xml file found in xml_dir.
+
+    Scores are independent of each other and the music21 key analysis is
+    CPU-bound, so files are distributed over a pool of worker processes
+    (max_workers defaults to the number of CPUs). A failing file is reported
+    and skipped; the remaining files are still processed, and the names of
+    the failed files are returned.
+    """
+    files = sorted(f for f in os.listdir(xml_dir) if f.lower().endswith(".xml"))
+    if not files:
+        print(f"No .xml files found in folder: {xml_dir}")
+        return []
+
+    print(f"Extracting metadata for {len(files)} MusicXML files in: {xml_dir}")
+    failed: List[str] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_xml_file, os.path.join(xml_dir, fname)): fname
+            for fname in files
+        }
+        for future in as_completed(futures):
+            fname = futures[future]
+            try:
+                output_jsonld_path = future.result()
+            except Exception as exc:
+                print(f"[ERROR] Metadata step failed for {fname}: {exc}")
+                failed.append(fname)
+                continue
+            print(f"JSON-LD metadata written to: {output_jsonld_path}")
+
+    if failed:
+        print(f"[ERROR] {len(failed)} of {len(files)} MusicXML files failed")
+    return sorted(failed)
+
 
-    print(f"JSON-LD metadata written to: {output_jsonld_path}")
+# ====================================================
+# Main
+# ====================================================
+
+if __name__ == "__main__":
+    """
+    Usage:
+
+      python extract_metadata.py path/to/score.xml
+        -> writes JSON_LD/score.jsonld
+
+      python extract_metadata.py path/to/score_musicxml
+        -> processes every .xml file in the folder, in parallel
+    """
+    xml_path = MUSICXML_PATH
+    if len(sys.argv) > 1:
+        xml_path = sys.argv[1]
+
+    if os.path.isdir(xml_path):
+        if process_xml_folder(xml_path):
+            sys.exit(1)
+    else:
+        output_jsonld_path = process_xml_file(xml_path)
+        print(f"JSON-LD metadata written to: {output_jsonld_path}")
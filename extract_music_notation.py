@@ -2,8 +2,24 @@ from __future__ import annotations
 import os
 import sys
 import json
-import xml.etree.ElementTree as ET
-from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# Prefer lxml (libxml2) to parse MusicXML; fall back to the standard library.
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
+# Prefer orjson to (de)serialize the JSON-LD; fall back to the standard library.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 
 # ====================================================
@@ -25,11 +41,69 @@ HO_IRI  = "https://github.com/andreamust/HaMSE_Ontology/schema#"
 DCT_IRI = "http://purl.org/dc/terms/"
 RDFS_IRI = "http://www.w3.org/2000/01/rdf-schema#"
 
+# Extra iterparse options: with lxml, lift libxml2's size limits for very large scores.
+ITERPARSE_OPTIONS: Dict[str, Any] = {"huge_tree": True} if LXML_AVAILABLE else {}
+
 
 # ====================================================
 # Helpers
 # ====================================================
 
+def read_jsonld(path: str) -> Dict[str, Any]:
+    """
+    Load a JSON-LD document, with orjson when available.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_jsonld_chunks(jsonld_obj: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    Serialize a JSON-LD document with orjson, one @graph node at a time.
+
+    The chunks concatenate to orjson.dumps(jsonld_obj, option=OPT_INDENT_2),
+    but the whole document is never held in memory as a single bytes object.
+    JSON strings cannot contain raw newlines, so nested values are re-indented
+    by replacing b"\n".
+    """
+    option = orjson.OPT_INDENT_2
+    if not jsonld_obj:
+        yield b"{}"
+        return
+
+    sep = b"{"
+    for key, value in jsonld_obj.items():
+        yield sep + b"\n  " + orjson.dumps(key) + b": "
+        sep = b","
+        if key == "@graph" and isinstance(value, list) and value:
+            node_sep = b"["
+            for node in value:
+                yield node_sep + b"\n    " + orjson.dumps(node, option=option).replace(b"\n", b"\n    ")
+                node_sep = b","
+            yield b"\n  ]"
+        else:
+            yield orjson.dumps(value, option=option).replace(b"\n", b"\n  ")
+    yield b"\n}"
+
+
+def write_jsonld(path: str, jsonld_obj: Dict[str, Any]) -> None:
+    """
+    Write a JSON-LD document as UTF-8 JSON indented with 2 spaces.
+
+    Use orjson when installed, streaming the @graph node by node (see
+    iter_jsonld_chunks); fall back to json.dump.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.writelines(iter_jsonld_chunks(jsonld_obj))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+
+
 def derive_work_ids(xml_path: str) -> Dict[str, str]:
     base_name = os.path.splitext(os.path.basename(xml_path))[0]
     work_local_id = base_name
@@ -37,33 +111,155 @@ def derive_work_ids(xml_path: str) -> Dict[str, str]:
     return {"work_local_id": work_local_id, "work_iri": work_iri}
 
 
-def detect_movements(measures: List[ET.Element]) -> List[Dict[str, int]]:
-    start_indices: List[int] = []
-    for i, meas in enumerate(measures):
-        if meas.get("number") == "1":
-            start_indices.append(i)
+def is_movement_start(meas_el: ET.Element) -> bool:
+    """
+    A measure whose MusicXML @number is "1" starts a new movement.
+
+    This is the same rule extract_structure uses to build the movements.
+    """
+    return meas_el.get("number") == "1"
+
+
+def iter_movement_measures(xml_path: str) -> Iterator[Tuple[int, int, ET.Element]]:
+    """
+    Stream the <measure> elements of the first <part> of a MusicXML file.
+
+    Yields (movement_index, measure_position, measure_element), where
+    measure_position is the 0-based index of the measure inside the part.
+
+    Movements are detected on the fly with is_movement_start:
+      - Every measure whose @number == "1" starts a new movement.
+      - Measures before the first such measure are skipped.
+    If no measure with @number == "1" is found, the whole part is a single
+    movement (those measures are buffered until the end of the part).
+
+    Each measure is cleared and detached once the caller has processed it,
+    so memory stays bounded by one measure instead of the whole score.
+    Parsing stops at the end of the first <part>.
+    """
+    part_el = None
+    depth = 0
+    position = 0
+    movement_index = 0
+    # Measures seen before the first @number == "1" (only used if there is none)
+    leading_measures: List[Tuple[int, ET.Element]] = []
+
+    with open(xml_path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end"), **ITERPARSE_OPTIONS):
+            if event == "start":
+                depth += 1
+                if depth == 2 and part_el is None and elem.tag == "part":
+                    part_el = elem
+                continue
+
+            depth -= 1
+            if part_el is None:
+                # Header blocks (work, identification, credit, part-list...) are never read
+                if depth == 1:
+                    elem.clear()
+                continue
+            if elem is part_el:
+                break
+            if depth != 2 or elem.tag != "measure":
+                continue
+
+            meas_el = elem
+            meas_pos = position
+            position += 1
+
+            if is_movement_start(meas_el):
+                movement_index += 1
+                for _, skipped_el in leading_measures:
+                    skipped_el.clear()
+                    part_el.remove(skipped_el)
+                leading_measures = []
+
+            if movement_index == 0:
+                leading_measures.append((meas_pos, meas_el))
+                continue
+
+            yield movement_index, meas_pos, meas_el
+
+            meas_el.clear()
+            part_el.remove(meas_el)
 
-    if not start_indices:
-        return [{"movement_index": 1, "start_idx": 0, "end_idx": len(measures)}]
+    if part_el is None:
+        raise ValueError("No <part> element found in MusicXML file.")
+    if position == 0:
+        raise ValueError("No <measure> elements found in the first <part>.")
 
-    start_indices = sorted(start_indices)
-    movements: List[Dict[str, int]] = []
-    for idx, start in enumerate(start_indices):
-        movement_index = idx + 1
-        if idx + 1 < len(start_indices):
-            end = start_indices[idx + 1]
+    for meas_pos, meas_el in leading_measures:
+        yield 1, meas_pos, meas_el
+
+
+def bin_children(el: ET.Element) -> Dict[str, List[ET.Element]]:
+    """
+    Group the children of el by tag, in document order, in one pass.
+
+    Replaces repeated el.find / el.findall calls (each a linear scan of the
+    children). Comments and processing instructions (lxml) are skipped.
+    """
+    out: Dict[str, List[ET.Element]] = {}
+    for child in el:
+        tag = child.tag
+        if tag.__class__ is not str:
+            continue
+        bucket = out.get(tag)
+        if bucket is None:
+            out[tag] = [child]
         else:
-            end = len(measures)
-        movements.append(
-            {"movement_index": movement_index, "start_idx": start, "end_idx": end}
-        )
-    return movements
+            bucket.append(child)
+    return out
+
+
+def first_child(kids: Dict[str, List[ET.Element]], tag: str) -> Optional[ET.Element]:
+    """
+    Equivalent of el.find(tag) on the result of bin_children(el).
+    """
+    bucket = kids.get(tag)
+    return bucket[0] if bucket else None
+
+
+class _SanitizeTable(dict):
+    """
+    str.translate table mapping every non-alphanumeric character to "_".
+
+    Filled lazily (and cached) so that it follows str.isalnum for any Unicode
+    character, exactly like the original per-character test.
+    """
+
+    def __missing__(self, codepoint: int):
+        value = codepoint if chr(codepoint).isalnum() else "_"
+        self[codepoint] = value
+        return value
+
+
+_SANITIZE_TABLE = _SanitizeTable()
 
 
 def sanitize_measure_number(raw_number: Optional[str], fallback_index: int) -> str:
     if not raw_number:
-        raw_number = str(fallback_index)
-    return "".join(ch if ch.isalnum() else "_" for ch in raw_number)
+        return str(fallback_index)
+    if raw_number.isalnum():
+        return raw_number
+    return raw_number.translate(_SANITIZE_TABLE)
+
+
+# Zero-padded event index strings, "000001", "000002", ... (grown on demand).
+_EVENT_INDEX_STRS: List[str] = []
+
+
+def format_event_index(index: int) -> str:
+    """
+    Return the 1-based event index as the 6-digit string used in event ids.
+
+    Strings are cached at module level, so every score processed by the same
+    process (e.g. a folder worker) reuses them.
+    """
+    cache = _EVENT_INDEX_STRS
+    while len(cache) < index:
+        cache.append(f"{len(cache) + 1:06d}")
+    return cache[index - 1]
 
 
 def parse_int_or_keep_string(value: Optional[str]):
@@ -91,18 +287,101 @@ def append_unique_id_ref(list_value: Any, new_id: str) -> List[Dict[str, str]]:
     return current
 
 
+def add_unique_id_ref(
+    node: Dict[str, Any],
+    prop: str,
+    new_id: str,
+    seen_refs: Dict[Tuple[str, str], set],
+) -> None:
+    """
+    Add {"@id": new_id} to node[prop] without duplicates, in O(1).
+
+    seen_refs maps (node @id, prop) to the set of ids already linked. The first
+    time a (node, prop) pair is touched, the existing value is normalized with
+    append_unique_id_ref and its ids are recorded; later calls only check the set.
+    """
+    key = (node["@id"], prop)
+    seen = seen_refs.get(key)
+    if seen is None:
+        refs = append_unique_id_ref(node.get(prop), new_id)
+        node[prop] = refs
+        seen_refs[key] = {item.get("@id") for item in refs if isinstance(item, dict)}
+        return
+    if new_id not in seen:
+        seen.add(new_id)
+        node[prop].append({"@id": new_id})
+
+
+def ensure_types(
+    node: Dict[str, Any],
+    required: Tuple[str, ...],
+    type_index: Dict[str, set],
+) -> None:
+    """
+    Make sure node["@type"] is a list containing every type in required.
+
+    type_index maps node @id to the set of its types, so membership is O(1);
+    the @type list itself keeps its insertion order.
+    """
+    node_id = node["@id"]
+    seen = type_index.get(node_id)
+    if seen is None:
+        types = node.get("@type", [])
+        if isinstance(types, str):
+            types = [types]
+        node["@type"] = types
+        seen = type_index[node_id] = set(types)
+    else:
+        types = node["@type"]
+    for t in required:
+        if t not in seen:
+            seen.add(t)
+            types.append(t)
+
+
+# Base @type tuples of the nodes created by this script.
+TIME_SIGNATURE_TYPES = ("mso:TimeSignature", "so:MusicNotationElement", "mto:Signature")
+CLEF_TYPES = ("mso:Clef", "so:MusicNotationElement")
+TEMPO_TYPES = ("so:Tempo", "so:MusicNotationElement")
+NOTE_EVENT_TYPES = ("ho:SymbolicEvent", "so:MusicNotationElement", "mso:Note")
+REST_EVENT_TYPES = ("ho:SymbolicEvent", "so:MusicNotationElement", "mso:Rest")
+DURATION_TYPES = ("so:Duration", "so:MusicNotationElement")
+PITCH_TYPES = ("so:Pitch", "so:MelodicElement")
+ACCIDENTAL_TYPES = ("mto:Accidental", "so:MelodicElement")
+
+# MusicXML <accidental> text -> (accidental class, semitone shift)
+ACCIDENTAL_MAP: Dict[str, Tuple[Optional[str], Optional[int]]] = {
+    "flat": ("so:Flat", -1),
+    "natural": ("so:Natural", 0),
+    "sharp": ("so:Sharp", 1),
+    "double-flat": ("so:DoubleFlat", -2),
+    "double-sharp": ("so:DoubleSharp", 2),
+    "flat-flat": ("so:FlatFlat", -2),
+    "sharp-sharp": ("so:SharpSharp", 2),
+}
+
+# MusicXML <type> -> duration class, without dots and with one dot
+BASE_DURATION_MAP: Dict[str, str] = {
+    "whole": "so:WholeNote",
+    "half": "so:HalfNote",
+    "quarter": "so:QuarterNote",
+    "eighth": "so:EighthNote",
+    "16th": "so:SixteenthNote",
+    "32nd": "so:ThirtySecondNote",
+    "64th": "so:SixtyFourthNote",
+}
+
+DOTTED_DURATION_MAP: Dict[str, str] = {
+    "half": "so:DottedHalf",
+    "quarter": "so:DottedQuarter",
+    "eighth": "so:DottedEighth",
+}
+
+_NO_ACCIDENTAL: Tuple[Optional[str], Optional[int]] = (None, None)
+
+
 def map_accidental_class_and_shift(acc_text: str) -> Tuple[Optional[str], Optional[int]]:
-    acc_text = acc_text.strip().lower()
-    mapping: Dict[str, Tuple[Optional[str], Optional[int]]] = {
-        "flat": ("so:Flat", -1),
-        "natural": ("so:Natural", 0),
-        "sharp": ("so:Sharp", 1),
-        "double-flat": ("so:DoubleFlat", -2),
-        "double-sharp": ("so:DoubleSharp", 2),
-        "flat-flat": ("so:FlatFlat", -2),
-        "sharp-sharp": ("so:SharpSharp", 2),
-    }
-    return mapping.get(acc_text, (None, None))
+    return ACCIDENTAL_MAP.get(acc_text.strip().lower(), _NO_ACCIDENTAL)
 
 
 def map_duration_class(note_type: Optional[str], dots: int) -> Optional[str]:
@@ -111,32 +390,16 @@ def map_duration_class(note_type: Optional[str], dots: int) -> Optional[str]:
 
     note_type = note_type.strip().lower()
 
-    base_mapping = {
-        "whole": "so:WholeNote",
-        "half": "so:HalfNote",
-        "quarter": "so:QuarterNote",
-        "eighth": "so:EighthNote",
-        "16th": "so:SixteenthNote",
-        "32nd": "so:ThirtySecondNote",
-        "64th": "so:SixtyFourthNote",
-    }
-
     if dots == 0:
-        return base_mapping.get(note_type)
+        return BASE_DURATION_MAP.get(note_type)
 
     if dots == 1:
-        if note_type == "whole":
-            return None
-        dotted_mapping = {
-            "half": "so:DottedHalf",
-            "quarter": "so:DottedQuarter",
-            "eighth": "so:DottedEighth",
-        }
-        return dotted_mapping.get(note_type)
+        return DOTTED_DURATION_MAP.get(note_type)
 
     return None
 
 
+@lru_cache(maxsize=256)
 def map_time_signature_class(numerator: int, denominator: int) -> Optional[str]:
     return f"so:TS_{numerator}_{denominator}"
 
@@ -149,19 +412,6 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
     ids = derive_work_ids(xml_path)
     work_local_id = ids["work_local_id"]
 
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-
-    part_el = root.find("./part")
-    if part_el is None:
-        raise ValueError("No <part> element found in MusicXML file.")
-
-    measures = part_el.findall("measure")
-    if not measures:
-        raise ValueError("No <measure> elements found in the first <part>.")
-
-    movements_info = detect_movements(measures)
-
     try:
         base_dir = os.path.dirname(os.path.abspath(__file__))
     except NameError:
@@ -179,8 +429,7 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
             f"Please run extract_metadata.py and extract_structure.py first."
         )
 
-    with open(jsonld_path, "r", encoding="utf-8") as f:
-        jsonld_obj = json.load(f)
+    jsonld_obj = read_jsonld(jsonld_path)
 
     context = jsonld_obj.get("@context", {})
     context.setdefault("so", SO_IRI)
@@ -194,58 +443,77 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
 
     graph: List[Dict[str, Any]] = jsonld_obj.get("@graph", [])
 
-    node_by_id: Dict[str, Dict[str, Any]] = {}
-    for node in graph:
-        if isinstance(node, dict) and "@id" in node:
-            node_by_id[node["@id"]] = node
+    # Every @graph entry is a node object written by the earlier scripts
+    node_by_id: Dict[str, Dict[str, Any]] = {
+        node["@id"]: node for node in graph if "@id" in node
+    }
+    node_by_id_get = node_by_id.get
+    graph_append = graph.append
+
+    # @id -> set of @type values, kept in sync with the nodes' @type lists
+    type_index: Dict[str, set] = {}
 
-    def get_or_create_node(node_id: str, base_types: List[str]) -> Dict[str, Any]:
-        node = node_by_id.get(node_id)
+    def get_or_create_node(node_id: str, base_types: Tuple[str, ...]) -> Dict[str, Any]:
+        node = node_by_id_get(node_id)
         if node is None:
             node = {"@id": node_id, "@type": list(base_types)}
-            graph.append(node)
+            graph_append(node)
             node_by_id[node_id] = node
+            type_index[node_id] = set(base_types)
         else:
-            types = node.get("@type", [])
-            if isinstance(types, str):
-                types = [types]
-            for t in base_types:
-                if t not in types:
-                    types.append(t)
-            node["@type"] = types
+            ensure_types(node, base_types, type_index)
         return node
 
-    # active_clef_by_staff: current clef *instance* id per staff (per movement)
-    active_clef_by_staff: Dict[Tuple[int, int], str] = {}
+    # active_clef_by_staff: current clef *instance* id per staff of the current
+    # movement (reset when a new movement starts)
+    active_clef_by_staff: Dict[int, str] = {}
 
     global_event_counter = 1
 
-    for m_info in movements_info:
-        movement_index = m_info["movement_index"]
-        start_idx = m_info["start_idx"]
-        end_idx = m_info["end_idx"]
-
-        for i in range(start_idx, end_idx):
-            meas_el = measures[i]
-            raw_number = meas_el.get("number")
-            sanitized_number = sanitize_measure_number(raw_number, fallback_index=i + 1)
-
-            measure_id = f"so:{work_local_id}_M{movement_index}_Measure_{sanitized_number}"
-            measure_node = node_by_id.get(measure_id)
-            if measure_node is None:
-                value_for_number = parse_int_or_keep_string(raw_number) if raw_number else (i + 1)
-                measure_node = {
-                    "@id": measure_id,
-                    "@type": ["mso:Measure"],
-                    "so:number": value_for_number,
-                }
-                graph.append(measure_node)
-                node_by_id[measure_id] = measure_node
-
-            attrs = meas_el.find("attributes")
+    # Ids already linked through a list-valued property, per (node @id, property)
+    seen_refs: Dict[Tuple[str, str], set] = {}
+
+    # Shared Duration / Accidental node ids, keyed by (note type, dots) / class
+    duration_ids: Dict[Tuple[Optional[str], int], str] = {}
+    accidental_ids: Dict[Optional[str], str] = {}
+
+    # Id prefix shared by every node of the current movement ("so:<work>_M<n>_")
+    prefix_movement_index = None
+    mv_prefix = ""
+
+    # The MusicXML is streamed measure by measure (see iter_movement_measures).
+    for movement_index, i, meas_el in iter_movement_measures(xml_path):
+        if movement_index != prefix_movement_index:
+            prefix_movement_index = movement_index
+            mv_prefix = f"so:{work_local_id}_M{movement_index}_"
+            active_clef_by_staff = {}
+
+        raw_number = meas_el.get("number")
+        sanitized_number = sanitize_measure_number(raw_number, fallback_index=i + 1)
+
+        measure_id = mv_prefix + "Measure_" + sanitized_number
+        # Every event id of this measure starts with the same stem
+        event_id_stem = measure_id + "_Event_"
+        measure_node = node_by_id_get(measure_id)
+        if measure_node is None:
+            value_for_number = parse_int_or_keep_string(raw_number) if raw_number else (i + 1)
+            measure_node = {
+                "@id": measure_id,
+                "@type": ["mso:Measure"],
+                "so:number": value_for_number,
+            }
+            graph_append(measure_node)
+            node_by_id[measure_id] = measure_node
+
+        meas_kids = bin_children(meas_el)
+        attrs = first_child(meas_kids, "attributes")
+
+        # Time signature and clefs both come from <attributes>, which most measures lack
+        if attrs is not None:
+            attrs_kids = bin_children(attrs)
 
             # ---------------- Time signature ----------------
-            time_el = attrs.find("time") if attrs is not None else None
+            time_el = first_child(attrs_kids, "time")
             if time_el is not None:
                 beats_el = time_el.find("beats")
                 beat_type_el = time_el.find("beat-type")
@@ -263,10 +531,10 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
                     symbol = symbol_el.text.strip()
 
                 if numerator is not None and denominator is not None:
-                    ts_id = f"{measure_id}_TimeSig"
+                    ts_id = measure_id + "_TimeSig"
                     ts_node = get_or_create_node(
                         ts_id,
-                        base_types=["mso:TimeSignature", "so:MusicNotationElement", "mto:Signature" ],
+                        base_types=TIME_SIGNATURE_TYPES,
                     )
                     ts_node["so:numerator"] = numerator
                     ts_node["so:denominator"] = denominator
@@ -276,12 +544,7 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
                     if isinstance(numerator, int) and isinstance(denominator, int):
                         ts_class = map_time_signature_class(numerator, denominator)
                         if ts_class is not None:
-                            ts_types = ts_node.get("@type", [])
-                            if isinstance(ts_types, str):
-                                ts_types = [ts_types]
-                            if ts_class not in ts_types:
-                                ts_types.append(ts_class)
-                            ts_node["@type"] = ts_types
+                            ensure_types(ts_node, (ts_class,), type_index)
 
                     measure_node["so:hasTimeSignature"] = {"@id": ts_id}
                     ts_node["so:timeSignatureOf"] = {"@id": measure_id}
@@ -290,189 +553,179 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
             # Here we create **one clef instance per (movement, staff)**:
             #   so:Beethoven_Op002No1-01_M1_Staff_1_Clef
             # and reuse it across all measures. staffHasClef references only this.
-            if attrs is not None:
-                for clef_el in attrs.findall("clef"):
-                    sign_el = clef_el.find("sign")
-                    line_el = clef_el.find("line")
-                    staff_el = clef_el.find("staff")
-
-                    sign = sign_el.text.strip() if sign_el is not None and sign_el.text else None
-                    line_val = None
-                    if line_el is not None and line_el.text:
-                        line_val = parse_int_or_keep_string(line_el.text.strip())
-
-                    staff_index = 1
-                    if staff_el is not None and staff_el.text:
-                        try:
-                            staff_index = int(staff_el.text.strip())
-                        except ValueError:
-                            pass
-
-                    # Single clef per (movement, staff), independent of measure:
-                    clef_id = f"so:{work_local_id}_M{movement_index}_Staff_{staff_index}_Clef"
-                    clef_node = get_or_create_node(
-                        clef_id,
-                        base_types=["mso:Clef", "so:MusicNotationElement"],
-                    )
+            for clef_el in attrs_kids.get("clef", ()):
+                sign_el = clef_el.find("sign")
+                line_el = clef_el.find("line")
+                staff_el = clef_el.find("staff")
 
-                    if sign is not None:
-                        clef_node["so:sign"] = sign
-                    if line_val is not None:
-                        clef_node["so:line"] = line_val
+                sign = sign_el.text.strip() if sign_el is not None and sign_el.text else None
+                line_val = None
+                if line_el is not None and line_el.text:
+                    line_val = parse_int_or_keep_string(line_el.text.strip())
 
-                    # Update active clef for this (movement, staff) pair
-                    active_clef_by_staff[(movement_index, staff_index)] = clef_id
+                staff_index = 1
+                if staff_el is not None and staff_el.text:
+                    try:
+                        staff_index = int(staff_el.text.strip())
+                    except ValueError:
+                        pass
 
-                    # Link staff -> clef (so:staffHasClef) ONLY to this staff-level clef
-                    staff_id = f"so:{work_local_id}_M{movement_index}_Staff_{staff_index}"
-                    staff_node = node_by_id.get(staff_id)
-                    if staff_node is not None:
-                        staff_node["so:staffHasClef"] = append_unique_id_ref(
-                            staff_node.get("so:staffHasClef"), clef_id
-                        )
+                # Single clef per (movement, staff), independent of measure:
+                clef_id = f"{mv_prefix}Staff_{staff_index}_Clef"
+                clef_node = get_or_create_node(
+                    clef_id,
+                    base_types=CLEF_TYPES,
+                )
 
-                    # Optional: measure can also reference which clef is in effect
-                    measure_node["so:hasClef"] = append_unique_id_ref(
-                        measure_node.get("so:hasClef"), clef_id
-                    )
+                if sign is not None:
+                    clef_node["so:sign"] = sign
+                if line_val is not None:
+                    clef_node["so:line"] = line_val
+
+                # Update active clef for this (movement, staff) pair
+                active_clef_by_staff[staff_index] = clef_id
+
+                # Link staff -> clef (so:staffHasClef) ONLY to this staff-level clef
+                staff_id = f"{mv_prefix}Staff_{staff_index}"
+                staff_node = node_by_id_get(staff_id)
+                if staff_node is not None:
+                    add_unique_id_ref(staff_node, "so:staffHasClef", clef_id, seen_refs)
+
+                # Optional: measure can also reference which clef is in effect
+                add_unique_id_ref(measure_node, "so:hasClef", clef_id, seen_refs)
+
+        # ---------------- Tempo ----------------
+        tempo_local_index = 1
+
+        for sound_el in meas_kids.get("sound", ()):
+            tempo_attr = sound_el.get("tempo")
+            if tempo_attr:
+                try:
+                    bpm_val = int(tempo_attr)
+                except ValueError:
+                    bpm_val = tempo_attr.strip()
+
+                tempo_id = f"{measure_id}_Tempo_{tempo_local_index}"
+                tempo_local_index += 1
+
+                tempo_node = get_or_create_node(
+                    tempo_id,
+                    base_types=TEMPO_TYPES,
+                )
+                tempo_node["so:bpm"] = bpm_val
+
+                add_unique_id_ref(measure_node, "so:hasTempo", tempo_id, seen_refs)
+                tempo_node["so:isTempoOf"] = {"@id": measure_id}
 
-            # ---------------- Tempo ----------------
-            tempo_local_index = 1
+        for direction in meas_kids.get("direction", ()):
+            tempo_text = None
+            words_el = direction.find("./direction-type/words")
+            if words_el is not None and words_el.text:
+                tempo_text = words_el.text.strip()
 
-            for sound_el in meas_el.findall("sound"):
+            sound_el = direction.find("sound")
+            if sound_el is not None and sound_el.get("tempo"):
                 tempo_attr = sound_el.get("tempo")
-                if tempo_attr:
-                    try:
-                        bpm_val = int(tempo_attr)
-                    except ValueError:
-                        bpm_val = tempo_attr.strip()
+                try:
+                    bpm_val = int(tempo_attr)
+                except ValueError:
+                    bpm_val = tempo_attr.strip()
 
-                    tempo_id = f"{measure_id}_Tempo_{tempo_local_index}"
-                    tempo_local_index += 1
+                tempo_id = f"{measure_id}_Tempo_{tempo_local_index}"
+                tempo_local_index += 1
 
-                    tempo_node = get_or_create_node(
-                        tempo_id,
-                        base_types=["so:Tempo", "so:MusicNotationElement"],
-                    )
-                    tempo_node["so:bpm"] = bpm_val
+                tempo_node = get_or_create_node(
+                    tempo_id,
+                    base_types=TEMPO_TYPES,
+                )
+                tempo_node["so:bpm"] = bpm_val
+                if tempo_text is not None:
+                    tempo_node["so:tempoText"] = tempo_text
 
-                    measure_node["so:hasTempo"] = append_unique_id_ref(
-                        measure_node.get("so:hasTempo"), tempo_id
-                    )
-                    tempo_node["so:isTempoOf"] = {"@id": measure_id}
+                add_unique_id_ref(measure_node, "so:hasTempo", tempo_id, seen_refs)
+                tempo_node["so:isTempoOf"] = {"@id": measure_id}
+                continue
 
-            for direction in meas_el.findall("direction"):
-                tempo_text = None
-                words_el = direction.find("./direction-type/words")
-                if words_el is not None and words_el.text:
-                    tempo_text = words_el.text.strip()
+            metro_el = direction.find("./direction-type/metronome")
+            if metro_el is not None:
+                beat_unit_el = metro_el.find("beat-unit")
+                per_minute_el = metro_el.find("per-minute")
 
-                sound_el = direction.find("sound")
-                if sound_el is not None and sound_el.get("tempo"):
-                    tempo_attr = sound_el.get("tempo")
+                bpm_val = None
+                if per_minute_el is not None and per_minute_el.text:
                     try:
-                        bpm_val = int(tempo_attr)
+                        bpm_val = int(per_minute_el.text.strip())
                     except ValueError:
-                        bpm_val = tempo_attr.strip()
+                        bpm_val = per_minute_el.text.strip()
 
+                if bpm_val is not None:
                     tempo_id = f"{measure_id}_Tempo_{tempo_local_index}"
                     tempo_local_index += 1
 
                     tempo_node = get_or_create_node(
                         tempo_id,
-                        base_types=["so:Tempo", "so:MusicNotationElement"],
+                        base_types=TEMPO_TYPES,
                     )
                     tempo_node["so:bpm"] = bpm_val
                     if tempo_text is not None:
                         tempo_node["so:tempoText"] = tempo_text
+                    if beat_unit_el is not None and beat_unit_el.text:
+                        tempo_node["so:beatUnit"] = beat_unit_el.text.strip()
 
-                    measure_node["so:hasTempo"] = append_unique_id_ref(
-                        measure_node.get("so:hasTempo"), tempo_id
-                    )
+                    add_unique_id_ref(measure_node, "so:hasTempo", tempo_id, seen_refs)
                     tempo_node["so:isTempoOf"] = {"@id": measure_id}
-                    continue
-
-                metro_el = direction.find("./direction-type/metronome")
-                if metro_el is not None:
-                    beat_unit_el = metro_el.find("beat-unit")
-                    per_minute_el = metro_el.find("per-minute")
-
-                    bpm_val = None
-                    if per_minute_el is not None and per_minute_el.text:
-                        try:
-                            bpm_val = int(per_minute_el.text.strip())
-                        except ValueError:
-                            bpm_val = per_minute_el.text.strip()
-
-                    if bpm_val is not None:
-                        tempo_id = f"{measure_id}_Tempo_{tempo_local_index}"
-                        tempo_local_index += 1
-
-                        tempo_node = get_or_create_node(
-                            tempo_id,
-                            base_types=["so:Tempo", "so:MusicNotationElement"],
-                        )
-                        tempo_node["so:bpm"] = bpm_val
-                        if tempo_text is not None:
-                            tempo_node["so:tempoText"] = tempo_text
-                        if beat_unit_el is not None and beat_unit_el.text:
-                            tempo_node["so:beatUnit"] = beat_unit_el.text.strip()
-
-                        measure_node["so:hasTempo"] = append_unique_id_ref(
-                            measure_node.get("so:hasTempo"), tempo_id
-                        )
-                        tempo_node["so:isTempoOf"] = {"@id": measure_id}
-
-            # ---------------- Symbolic events (Note/Rest) ----------------
-            for note_el in meas_el.findall("note"):
-                is_rest = note_el.find("rest") is not None
 
-                staff_index = 1
-                staff_el = note_el.find("staff")
-                if staff_el is not None and staff_el.text:
-                    try:
-                        staff_index = int(staff_el.text.strip())
-                    except ValueError:
-                        pass
-
-                event_index_str = f"{global_event_counter:06d}"
-                global_event_counter += 1
-
-                event_id = (
-                    f"so:{work_local_id}_M{movement_index}_Measure_"
-                    f"{sanitized_number}_Event_{event_index_str}"
+        # ---------------- Symbolic events (Note/Rest) ----------------
+        for note_el in meas_kids.get("note", ()):
+            note_kids = bin_children(note_el)
+            is_rest = "rest" in note_kids
+
+            staff_index = 1
+            staff_el = first_child(note_kids, "staff")
+            if staff_el is not None and staff_el.text:
+                try:
+                    staff_index = int(staff_el.text.strip())
+                except ValueError:
+                    pass
+
+            event_index_str = format_event_index(global_event_counter)
+            global_event_counter += 1
+
+            event_id = event_id_stem + event_index_str
+
+            event_node = get_or_create_node(
+                event_id,
+                base_types=REST_EVENT_TYPES if is_rest else NOTE_EVENT_TYPES,
+            )
+
+            event_node["so:isInMeasure"] = {"@id": measure_id}
+            add_unique_id_ref(measure_node, "so:hasSymbolicEvent", event_id, seen_refs)
+
+            # Duration
+            duration_el = first_child(note_kids, "duration")
+            type_el = first_child(note_kids, "type")
+            dots_count = len(note_kids.get("dot", ()))
+
+            if duration_el is not None and duration_el.text:
+                duration_val = parse_int_or_keep_string(duration_el.text.strip())
+            else:
+                duration_val = None
+
+            note_type_text = type_el.text.strip() if type_el is not None and type_el.text else None
+            duration_class = map_duration_class(note_type_text, dots_count)
+
+            # One shared Duration node per (note type, dots) in the work
+            dur_key = (note_type_text, dots_count)
+            dur_id = duration_ids.get(dur_key)
+            if dur_id is None:
+                dur_local = (
+                    note_type_text.translate(_SANITIZE_TABLE) if note_type_text else "unknown"
                 )
-
-                base_types = ["ho:SymbolicEvent", "so:MusicNotationElement"]
-                if is_rest:
-                    base_types.append("mso:Rest")
-                else:
-                    base_types.append("mso:Note")
-
-                event_node = get_or_create_node(event_id, base_types=base_types)
-
-                event_node["so:isInMeasure"] = {"@id": measure_id}
-                measure_node["so:hasSymbolicEvent"] = append_unique_id_ref(
-                    measure_node.get("so:hasSymbolicEvent"), event_id
-                )
-
-                # Duration
-                duration_el = note_el.find("duration")
-                type_el = note_el.find("type")
-                dots_count = len(note_el.findall("dot"))
-
-                if duration_el is not None and duration_el.text:
-                    duration_val = parse_int_or_keep_string(duration_el.text.strip())
-                else:
-                    duration_val = None
-
-                note_type_text = type_el.text.strip() if type_el is not None and type_el.text else None
-                duration_class = map_duration_class(note_type_text, dots_count)
-
-                dur_id = f"{event_id}_Dur"
+                dur_id = f"so:{work_local_id}_Duration_{dur_local}_d{dots_count}"
+                duration_ids[dur_key] = dur_id
                 dur_node = get_or_create_node(
                     dur_id,
-                    base_types=["so:Duration", "so:MusicNotationElement"],
+                    base_types=DURATION_TYPES,
                 )
 
                 #if duration_val is not None:
@@ -482,87 +735,80 @@ def extend_with_music_notation(xml_path: str) -> Dict[str, Any]:
                 dur_node["so:dots"] = dots_count
 
                 if duration_class is not None:
-                    dur_types = dur_node.get("@type", [])
-                    if isinstance(dur_types, str):
-                        dur_types = [dur_types]
-                    if duration_class not in dur_types:
-                        dur_types.append(duration_class)
-                    dur_node["@type"] = dur_types
-
-                event_node["so:hasDuration"] = {"@id": dur_id}
-
-                # Clef for this event: use staff-level active clef
-                clef_id = active_clef_by_staff.get((movement_index, staff_index))
-                if clef_id is not None:
-                    event_node["so:hasClef"] = {"@id": clef_id}
-
-                # Pitch + accidentals
-                if not is_rest:
-                    pitch_el = note_el.find("pitch")
-                    if pitch_el is not None:
-                        step_el = pitch_el.find("step")
-                        octave_el = pitch_el.find("octave")
-
-                        step = step_el.text.strip().upper() if step_el is not None and step_el.text else None
-                        octave_val = None
-                        if octave_el is not None and octave_el.text:
-                            octave_val = parse_int_or_keep_string(octave_el.text.strip())
-
-                        if octave_val is not None:
-                            event_node["so:octave"] = octave_val
-
-                        if step in {"A", "B", "C", "D", "E", "F", "G"}:
-                            pitch_id = f"{event_id}_Pitch"
-                            pitch_node = get_or_create_node(
-                                pitch_id,
-                                base_types=["so:Pitch", "so:MelodicElement"],
-                            )
-
-                            specific_pitch_class = f"so:{step}"
-                            pitch_types = pitch_node.get("@type", [])
-                            if isinstance(pitch_types, str):
-                                pitch_types = [pitch_types]
-                            if specific_pitch_class not in pitch_types:
-                                pitch_types.append(specific_pitch_class)
-                            pitch_node["@type"] = pitch_types
-
-                            event_node["so:hasPitch"] = {"@id": pitch_id}
-
-                            accidental_el = note_el.find("accidental")
-                            if accidental_el is not None and accidental_el.text:
-                                acc_text = accidental_el.text.strip()
-                                acc_class, semitone_shift = map_accidental_class_and_shift(acc_text)
-
-                                acc_id = f"{event_id}_Accidental"
+                    ensure_types(dur_node, (duration_class,), type_index)
+
+            event_node["so:hasDuration"] = {"@id": dur_id}
+
+            # Clef for this event: use staff-level active clef
+            clef_id = active_clef_by_staff.get(staff_index)
+            if clef_id is not None:
+                event_node["so:hasClef"] = {"@id": clef_id}
+
+            # Pitch + accidentals
+            if not is_rest:
+                pitch_el = first_child(note_kids, "pitch")
+                if pitch_el is not None:
+                    step_el = pitch_el.find("step")
+                    octave_el = pitch_el.find("octave")
+
+                    step = step_el.text.strip().upper() if step_el is not None and step_el.text else None
+                    octave_val = None
+                    if octave_el is not None and octave_el.text:
+                        octave_val = parse_int_or_keep_string(octave_el.text.strip())
+
+                    if octave_val is not None:
+                        event_node["so:octave"] = octave_val
+
+                    if step in {"A", "B", "C", "D", "E", "F", "G"}:
+                        pitch_id = event_id + "_Pitch"
+                        pitch_node = get_or_create_node(
+                            pitch_id,
+                            base_types=PITCH_TYPES,
+                        )
+
+                        specific_pitch_class = f"so:{step}"
+                        ensure_types(pitch_node, (specific_pitch_class,), type_index)
+
+                        event_node["so:hasPitch"] = {"@id": pitch_id}
+
+                        accidental_el = first_child(note_kids, "accidental")
+                        if accidental_el is not None and accidental_el.text:
+                            acc_text = accidental_el.text.strip()
+                            acc_class, semitone_shift = map_accidental_class_and_shift(acc_text)
+
+                            # One shared Accidental node per accidental class in the work
+                            acc_id = accidental_ids.get(acc_class)
+                            if acc_id is None:
+                                acc_local = acc_class[3:] if acc_class is not None else "Unknown"
+                                acc_id = f"so:{work_local_id}_Accidental_{acc_local}"
+                                accidental_ids[acc_class] = acc_id
                                 acc_node = get_or_create_node(
                                     acc_id,
-                                    base_types=["mto:Accidental", "so:MelodicElement"],
+                                    base_types=ACCIDENTAL_TYPES,
                                 )
 
                                 if acc_class is not None:
-                                    acc_types = acc_node.get("@type", [])
-                                    if isinstance(acc_types, str):
-                                        acc_types = [acc_types]
-                                    if acc_class not in acc_types:
-                                        acc_types.append(acc_class)
-                                    acc_node["@type"] = acc_types
+                                    ensure_types(acc_node, (acc_class,), type_index)
 
                                 if semitone_shift is not None:
                                     acc_node["so:semitoneShift"] = semitone_shift
 
-                                pitch_node["so:hasAccidental"] = {"@id": acc_id}
+                            pitch_node["so:hasAccidental"] = {"@id": acc_id}
 
     jsonld_obj["@graph"] = graph
     return jsonld_obj
 
 
 # ====================================================
-# Main
+# File / folder processing
 # ====================================================
 
-if __name__ == "__main__":
-    xml_path = MUSICXML_PATH
+def process_xml_file(xml_path: str) -> str:
+    """
+    Add the music-notation layer of one MusicXML file to its JSON-LD in JSONLD_DIR.
 
+    Returns the path of the written JSON-LD file.
+    """
     if not os.path.isfile(xml_path):
         raise FileNotFoundError(f"MusicXML file not found: {xml_path}")
 
@@ -579,7 +825,66 @@ if __name__ == "__main__":
     base_name = os.path.splitext(os.path.basename(xml_path))[0]
     output_jsonld_path = os.path.join(output_dir, base_name + ".jsonld")
 
-    with open(output_jsonld_path, "w", encoding="utf-8") as f:
-        json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+    write_jsonld(output_jsonld_path, jsonld_obj)
+
+    return output_jsonld_path
+
+
+def process_xml_folder(xml_dir: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Run process_xml_file on every .xml file found in xml_dir.
+
+    Each score only touches its own JSON-LD file, so files are distributed
+    over a pool of worker processes (max_workers defaults to the number of
+    CPUs). A failing file is reported and skipped; the names of the failed
+    files are returned.
+    """
+    files = sorted(f for f in os.listdir(xml_dir) if f.lower().endswith(".xml"))
+    if not files:
+        print(f"No .xml files found in folder: {xml_dir}")
+        return []
 
-    print(f"JSON-LD written to: {output_jsonld_path}")
+    print(f"Extracting music notation for {len(files)} MusicXML files in: {xml_dir}")
+    failed: List[str] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_xml_file, os.path.join(xml_dir, fname)): fname
+            for fname in files
+        }
+        for future in as_completed(futures):
+            fname = futures[future]
+            try:
+                output_jsonld_path = future.result()
+            except Exception as exc:
+                print(f"[ERROR] Music-notation step failed for {fname}: {exc}")
+                failed.append(fname)
+                continue
+            print(f"JSON-LD written to: {output_jsonld_path}")
+
+    if failed:
+        print(f"[ERROR] {len(failed)} of {len(files)} MusicXML files failed")
+    return sorted(failed)
+
+
+# ====================================================
+# Main
+# ====================================================
+
+if __name__ == "__main__":
+    """
+    Usage:
+
+      python extract_music_notation.py path/to/score.xml
+        -> updates JSON_LD/score.jsonld
+
+      python extract_music_notation.py path/to/score_musicxml
+        -> processes every .xml file in the folder, in parallel
+    """
+    xml_path = MUSICXML_PATH
+
+    if os.path.isdir(xml_path):
+        if process_xml_folder(xml_path):
+            sys.exit(1)
+    else:
+        output_jsonld_path = process_xml_file(xml_path)
+        print(f"JSON-LD written to: {output_jsonld_path}")
@@ -2,8 +2,23 @@ from __future__ import annotations
 import os
 import sys
 import json
-import xml.etree.ElementTree as ET
-from typing import Dict, Any, List
+import hashlib
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+
+# Prefer lxml (libxml2) to parse MusicXML; fall back to the standard library.
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
+# Prefer orjson to (de)serialize the JSON-LD; fall back to the standard library.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 
 # ====================================================
@@ -22,11 +37,73 @@ MSO_IRI = "http://linkeddata.uni-muenster.de/ontology/musicscore#"
 DCT_IRI = "http://purl.org/dc/terms/"
 RDFS_IRI = "http://www.w3.org/2000/01/rdf-schema#"
 
+# Prefixes every JSON-LD written by this script declares in its @context
+DEFAULT_CONTEXT: Dict[str, str] = {
+    "so": SO_IRI,
+    "mo": MO_IRI,
+    "mto": MTO_IRI,
+    "mso": MSO_IRI,
+    "dct": DCT_IRI,
+    "rdfs": RDFS_IRI,
+}
+
+# Top-level, non-RDF entry of the JSON-LD document holding pipeline bookkeeping.
+# It is not mapped in @context, so JSON-LD processors (rdflib) ignore it.
+PIPELINE_KEY = "_pipeline"
+
+# Base @type tuples of the structural nodes
+WORK_TYPES = ("mo:MusicalWork", "so:Sonata")
+MOVEMENT_TYPES = ("mso:Movement", "so:SonataMovement", "so:StructuralElement")
+STAFF_TYPES = ("mso:Staff", "so:PianoStaff", "so:StructuralElement")
+MEASURE_TYPES = ("mso:Measure", "so:StructuralElement")
+
+# Extra @type of a staff by its 1-based index (piano: upper / lower staff)
+STAFF_POSITION_TYPES = {1: ("so:UpperPianoStaff",), 2: ("so:LowerPianoStaff",)}
+
+# Extra iterparse options: with lxml, lift libxml2's size limits for very large scores.
+ITERPARSE_OPTIONS: Dict[str, Any] = {"huge_tree": True} if LXML_AVAILABLE else {}
+
 
 # ====================================================
 # Helpers
 # ====================================================
 
+def read_jsonld(path: str) -> Dict[str, Any]:
+    """
+    Load a JSON-LD document, with orjson when available.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_jsonld(path: str, jsonld_obj: Dict[str, Any]) -> None:
+    """
+    Write a JSON-LD document as UTF-8 JSON indented with 2 spaces.
+
+    Use orjson when installed; fall back to json.dump.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(jsonld_obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Return the BLAKE2b (128-bit) hex digest of a file's bytes.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 def derive_work_ids(xml_path: str) -> Dict[str, str]:
     base_name = os.path.splitext(os.path.basename(xml_path))[0]
     work_local_id = base_name              # e.g. "Beethoven_Op002No1-01"
@@ -34,67 +111,140 @@ def derive_work_ids(xml_path: str) -> Dict[str, str]:
     return {"work_local_id": work_local_id, "work_iri": work_iri}
 
 
-def detect_movements(measures: List[ET.Element]) -> List[Dict[str, int]]:
-    start_indices: List[int] = []
-    for i, meas in enumerate(measures):
-        if meas.get("number") == "1":
-            start_indices.append(i)
+class Movement(NamedTuple):
+    """Movement number (1-based) and its [start, end) range of measure indices."""
+    index: int
+    start: int
+    end: int
+
+
+def detect_movements(measure_numbers: List[Optional[str]]) -> List[Movement]:
+    # A measure numbered "1" starts a movement; indices come out already sorted.
+    start_indices = [i for i, number in enumerate(measure_numbers) if number == "1"]
 
     if not start_indices:
-        return [{"movement_index": 1, "start_idx": 0, "end_idx": len(measures)}]
-
-    start_indices = sorted(start_indices)
-    movements: List[Dict[str, int]] = []
-    for idx, start in enumerate(start_indices):
-        movement_index = idx + 1
-        if idx + 1 < len(start_indices):
-            end = start_indices[idx + 1]
-        else:
-            end = len(measures)
-        movements.append(
-            {"movement_index": movement_index, "start_idx": start, "end_idx": end}
-        )
-    return movements
-
-
-def detect_number_of_staves(part_el: ET.Element) -> int:
-    # 1) Explicit <attributes><staves>
-    for meas in part_el.findall("measure"):
-        attrs = meas.find("attributes")
-        if attrs is not None:
-            staves_el = attrs.find("staves")
-            if staves_el is not None and staves_el.text:
-                try:
-                    val = int(staves_el.text.strip())
-                    if val > 0:
-                        return val
-                except ValueError:
-                    pass
-
-    # 2) Infer from <note><staff>
+        return [Movement(1, 0, len(measure_numbers))]
+
+    end_indices = start_indices[1:] + [len(measure_numbers)]
+    return [
+        Movement(idx + 1, start, end)
+        for idx, (start, end) in enumerate(zip(start_indices, end_indices))
+    ]
+
+
+def scan_first_part(xml_path: str) -> Tuple[List[Optional[str]], int]:
+    """
+    Stream the first <part> of a MusicXML file in a single pass.
+
+    Returns (measure_numbers, num_staves): the @number of every <measure> in
+    document order (None when missing) and the number of staves, which is
+      1) the first valid <attributes><staves> of a measure,
+      2) else the highest <note><staff>,
+      3) else 2 (piano).
+    Only the first <attributes> of a measure and the first <staves> / <staff>
+    of an element are read. Measures are cleared and detached once scanned, so
+    no tree of the score is kept in memory.
+    """
+    measure_numbers: List[Optional[str]] = []
+    explicit_staves: Optional[int] = None
     max_staff = 0
-    for meas in part_el.findall("measure"):
-        for note in meas.findall("note"):
-            staff_el = note.find("staff")
-            if staff_el is not None and staff_el.text:
-                try:
-                    val = int(staff_el.text.strip())
-                    if val > max_staff:
-                        max_staff = val
-                except ValueError:
-                    pass
 
+    part_el = None
+    depth = 0
+    measure_has_attrs = False
+    # Depth-4 element being read (a direct child of the current measure)
+    block_tag = None
+    block_is_first_attrs = False
+    block_value_read = False
+
+    with open(xml_path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end"), **ITERPARSE_OPTIONS):
+            if event == "start":
+                depth += 1
+                if part_el is None:
+                    if depth == 2 and elem.tag == "part":
+                        part_el = elem
+                elif depth == 3:
+                    if elem.tag == "measure":
+                        measure_numbers.append(elem.get("number"))
+                    measure_has_attrs = False
+                elif depth == 4:
+                    block_tag = elem.tag
+                    block_is_first_attrs = block_tag == "attributes" and not measure_has_attrs
+                    if block_tag == "attributes":
+                        measure_has_attrs = True
+                    block_value_read = False
+                continue
+
+            elem_depth = depth
+            depth -= 1
+            if part_el is None:
+                # Header blocks (work, identification, credit, part-list...) are never read
+                if elem_depth == 2:
+                    elem.clear()
+                continue
+            if elem is part_el:
+                break
+
+            if elem_depth == 5 and not block_value_read:
+                tag = elem.tag
+                if block_tag == "attributes" and tag == "staves":
+                    block_value_read = True
+                    if block_is_first_attrs and explicit_staves is None and elem.text:
+                        try:
+                            val = int(elem.text.strip())
+                            if val > 0:
+                                explicit_staves = val
+                        except ValueError:
+                            pass
+                elif block_tag == "note" and tag == "staff":
+                    block_value_read = True
+                    if elem.text:
+                        try:
+                            val = int(elem.text.strip())
+                            if val > max_staff:
+                                max_staff = val
+                        except ValueError:
+                            pass
+            elif elem_depth == 3:
+                elem.clear()
+                part_el.remove(elem)
+
+    if part_el is None:
+        raise ValueError("No <part> element found in MusicXML file.")
+    if not measure_numbers:
+        raise ValueError("No <measure> elements found in the first <part>.")
+
+    if explicit_staves is not None:
+        return measure_numbers, explicit_staves
     if max_staff > 0:
-        return max_staff
+        return measure_numbers, max_staff
+    return measure_numbers, 2
+
+
+class _SanitizeTable(dict):
+    """
+    str.translate table mapping every non-alphanumeric character to "_".
+
+    Filled lazily (and cached) so that it follows str.isalnum for any Unicode
+    character, exactly like the original per-character test.
+    """
+
+    def __missing__(self, codepoint: int):
+        value = codepoint if chr(codepoint).isalnum() else "_"
+        self[codepoint] = value
+        return value
+
 
-    # 3) Default for piano
-    return 2
+_SANITIZE_TABLE = _SanitizeTable()
 
 
-def sanitize_measure_number(raw_number: str, fallback_index: int) -> str:
+def sanitize_measure_number(raw_number: Optional[str], fallback_index: int) -> str:
     if not raw_number:
-        raw_number = str(fallback_index)
-    return "".join(ch if ch.isalnum() else "_" for ch in raw_number)
+        return str(fallback_index)
+    if raw_number.isalnum():
+        return raw_number
+    return raw_number.translate(_SANITIZE_TABLE)
 
 
 def parse_int_or_keep_string(value: str):
@@ -104,20 +254,60 @@ def parse_int_or_keep_string(value: str):
         return value
 
 
-def append_unique_id_ref(list_value: Any, new_id: str) -> List[Dict[str, str]]:
-    if list_value is None:
-        current = []
-    elif isinstance(list_value, dict):
-        current = [list_value]
-    elif isinstance(list_value, list):
-        current = list_value
+def add_unique_id_ref(
+    node: Dict[str, Any],
+    prop: str,
+    new_id: str,
+    seen_refs: Dict[Tuple[str, str], set],
+) -> None:
+    """
+    Append {"@id": new_id} to the list node[prop] in place, without duplicates.
+
+    seen_refs maps (node @id, prop) to the set of ids already linked. The first
+    time a (node, prop) pair is touched, an existing single reference is wrapped
+    in a list (anything else that is not a list is dropped) and its ids are
+    recorded; later calls only check the set and append.
+    """
+    key = (node["@id"], prop)
+    seen = seen_refs.get(key)
+    if seen is None:
+        refs = node.get(prop)
+        if isinstance(refs, dict):
+            refs = [refs]
+        elif not isinstance(refs, list):
+            refs = []
+        node[prop] = refs
+        seen = seen_refs[key] = {item.get("@id") for item in refs if isinstance(item, dict)}
+    if new_id not in seen:
+        seen.add(new_id)
+        node[prop].append({"@id": new_id})
+
+
+def ensure_types(
+    node: Dict[str, Any],
+    required: Tuple[str, ...],
+    type_index: Dict[str, set],
+) -> None:
+    """
+    Make sure node["@type"] is a list containing every type in required.
+
+    type_index maps node @id to the set of its types, so membership is O(1);
+    the @type list itself keeps its insertion order.
+    """
+    node_id = node["@id"]
+    seen = type_index.get(node_id)
+    if seen is None:
+        types = node.get("@type", [])
+        if isinstance(types, str):
+            types = [types]
+        node["@type"] = types
+        seen = type_index[node_id] = set(types)
     else:
-        current = []
-
-    if not any(isinstance(item, dict) and item.get("@id") == new_id for item in current):
-        current.append({"@id": new_id})
-
-    return current
+        types = node["@type"]
+    for t in required:
+        if t not in seen:
+            seen.add(t)
+            types.append(t)
 
 
 # ====================================================
@@ -129,21 +319,6 @@ def extend_metadata_with_structure(xml_path: str) -> Dict[str, Any]:
     work_local_id = ids["work_local_id"]
     work_iri = ids["work_iri"]
 
-    # --- MusicXML ---
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-
-    part_el = root.find("./part")
-    if part_el is None:
-        raise ValueError("No <part> element found in MusicXML file.")
-
-    measures = part_el.findall("measure")
-    if not measures:
-        raise ValueError("No <measure> elements found in the first <part>.")
-
-    movements_info = detect_movements(measures)
-    num_staves = detect_number_of_staves(part_el)
-
     # --- Load existing JSON-LD (metadata) ---
     try:
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -160,108 +335,89 @@ def extend_metadata_with_structure(xml_path: str) -> Dict[str, Any]:
             f"Run extract_metadata.py first."
         )
 
-    with open(jsonld_path, "r", encoding="utf-8") as f:
-        jsonld_obj = json.load(f)
+    jsonld_obj = read_jsonld(jsonld_path)
+
+    # Skip the whole layer if it was already added from this exact MusicXML.
+    # Re-running metadata rewrites the JSON-LD without this marker.
+    source_hash = hash_file(xml_path)
+    pipeline_info = jsonld_obj.get(PIPELINE_KEY)
+    if isinstance(pipeline_info, dict) and pipeline_info.get("structureSourceHash") == source_hash:
+        return jsonld_obj
 
-    # Ensure context
-    context = jsonld_obj.get("@context", {})
-    context.setdefault("so", SO_IRI)
-    context.setdefault("mo", MO_IRI)
-    context.setdefault("mto", MTO_IRI)
-    context.setdefault("mso", MSO_IRI)
-    context.setdefault("dct", DCT_IRI)
-    context.setdefault("rdfs", RDFS_IRI)
-    jsonld_obj["@context"] = context
+    # --- MusicXML ---
+    measure_numbers, num_staves = scan_first_part(xml_path)
+    movements_info = detect_movements(measure_numbers)
+
+    # Ensure context (prefixes already declared in the document take precedence)
+    jsonld_obj["@context"] = {**DEFAULT_CONTEXT, **jsonld_obj.get("@context", {})}
 
     graph: List[Dict[str, Any]] = jsonld_obj.get("@graph", [])
 
-    # Index nodes by @id
+    # The graph is built as a dict of nodes keyed by @id (insertion-ordered, so
+    # existing nodes keep their position and new ones follow in creation order);
+    # the @graph list is only rebuilt at the end. Entries without an @id are
+    # kept as they are, after the identified nodes.
     node_by_id: Dict[str, Dict[str, Any]] = {}
+    other_entries: List[Any] = []
     for node in graph:
-        if isinstance(node, dict):
-            node_id = node.get("@id")
-            if node_id:
-                node_by_id[node_id] = node
+        node_id = node.get("@id") if isinstance(node, dict) else None
+        if node_id:
+            node_by_id[node_id] = node
+        else:
+            other_entries.append(node)
+
+    # @id -> set of @type values, kept in sync with the nodes' @type lists
+    type_index: Dict[str, set] = {}
 
     # Work node
     work_node = node_by_id.get(work_iri)
     if work_node is None:
         work_node = {
             "@id": work_iri,
-            "@type": ["mo:MusicalWork", "so:Sonata"],
+            "@type": list(WORK_TYPES),
         }
-        graph.append(work_node)
         node_by_id[work_iri] = work_node
     else:
-        types = work_node.get("@type", [])
-        if isinstance(types, str):
-            types = [types]
-        for t in ["mo:MusicalWork", "so:Sonata"]:
-            if t not in types:
-                types.append(t)
-        work_node["@type"] = types
+        ensure_types(work_node, WORK_TYPES, type_index)
+
+    # Ids already linked through a list-valued property, per (node @id, property)
+    seen_refs: Dict[Tuple[str, str], set] = {}
 
     has_movement_list: List[Dict[str, str]] = []
 
     # --- Movements, staffs, measures ---
-    for m_info in movements_info:
-        movement_index = m_info["movement_index"]
-        start_idx = m_info["start_idx"]
-        end_idx = m_info["end_idx"]
-
+    for movement_index, start_idx, end_idx in movements_info:
         movement_id = f"so:{work_local_id}_M{movement_index}"
 
         movement_node = node_by_id.get(movement_id)
         if movement_node is None:
-            movement_types = ["mso:Movement", "so:SonataMovement", "so:StructuralElement"]
-            movement_node = {"@id": movement_id, "@type": movement_types}
-            graph.append(movement_node)
+            movement_node = {"@id": movement_id, "@type": list(MOVEMENT_TYPES)}
             node_by_id[movement_id] = movement_node
         else:
-            types = movement_node.get("@type", [])
-            if isinstance(types, str):
-                types = [types]
-            for t in ["mso:Movement", "so:SonataMovement", "so:StructuralElement"]:
-                if t not in types:
-                    types.append(t)
-            movement_node["@type"] = types
+            ensure_types(movement_node, MOVEMENT_TYPES, type_index)
 
         movement_node["so:movementIndex"] = movement_index
 
         # --- Staffs (PianoStaff, StructuralElement) ---
         staff_ids_for_movement: List[Dict[str, str]] = []
         staff_nodes_for_movement: List[Dict[str, Any]] = []
+        staff_id_prefix = movement_id + "_Staff_"
 
         for staff_idx in range(1, num_staves + 1):
-            staff_id = f"so:{work_local_id}_M{movement_index}_Staff_{staff_idx}"
+            staff_id = staff_id_prefix + str(staff_idx)
+
+            staff_types = STAFF_TYPES + STAFF_POSITION_TYPES.get(staff_idx, ())
 
             staff_node = node_by_id.get(staff_id)
             if staff_node is None:
-                staff_types = ["mso:Staff", "so:PianoStaff", "so:StructuralElement"]
-                if staff_idx == 1:
-                    staff_types.append("so:UpperPianoStaff")
-                elif staff_idx == 2:
-                    staff_types.append("so:LowerPianoStaff")
-
                 staff_node = {
                     "@id": staff_id,
-                    "@type": staff_types,
+                    "@type": list(staff_types),
                     "so:staffIndex": staff_idx,
                 }
-                graph.append(staff_node)
                 node_by_id[staff_id] = staff_node
             else:
-                types = staff_node.get("@type", [])
-                if isinstance(types, str):
-                    types = [types]
-                for t in ["mso:Staff", "so:PianoStaff", "so:StructuralElement"]:
-                    if t not in types:
-                        types.append(t)
-                if staff_idx == 1 and "so:UpperPianoStaff" not in types:
-                    types.append("so:UpperPianoStaff")
-                if staff_idx == 2 and "so:LowerPianoStaff" not in types:
-                    types.append("so:LowerPianoStaff")
-                staff_node["@type"] = types
+                ensure_types(staff_node, staff_types, type_index)
                 staff_node["so:staffIndex"] = staff_idx
 
             staff_ids_for_movement.append({"@id": staff_id})
@@ -271,75 +427,62 @@ def extend_metadata_with_structure(xml_path: str) -> Dict[str, Any]:
         for sid_ref in staff_ids_for_movement:
             staff_id = sid_ref["@id"]
             # Generic relation Movement -> Staff
-            movement_node["so:movementHasStaff"] = append_unique_id_ref(
-                movement_node.get("so:movementHasStaff"), staff_id
-            )
+            add_unique_id_ref(movement_node, "so:movementHasStaff", staff_id, seen_refs)
             # Specific relation SonataMovement -> PianoStaff
-            movement_node["so:sonataMovementHasPianoStaff"] = append_unique_id_ref(
-                movement_node.get("so:sonataMovementHasPianoStaff"), staff_id
-            )
+            add_unique_id_ref(movement_node, "so:sonataMovementHasPianoStaff", staff_id, seen_refs)
 
         # --- Measures (also StructuralElement) ---
         measure_ids_for_movement: List[Dict[str, str]] = []
+        measure_id_prefix = movement_id + "_Measure_"
 
-        for i in range(start_idx, end_idx):
-            meas_el = measures[i]
-            raw_number = meas_el.get("number")
+        for i, raw_number in enumerate(measure_numbers[start_idx:end_idx], start_idx):
             sanitized = sanitize_measure_number(raw_number, fallback_index=i + 1)
 
-            measure_id = f"so:{work_local_id}_M{movement_index}_Measure_{sanitized}"
+            measure_id = measure_id_prefix + sanitized
 
             measure_node = node_by_id.get(measure_id)
             if measure_node is None:
                 value_for_number = parse_int_or_keep_string(raw_number) if raw_number else (i + 1)
                 measure_node = {
                     "@id": measure_id,
-                    "@type": ["mso:Measure", "so:StructuralElement"],
+                    "@type": list(MEASURE_TYPES),
                     "so:number": value_for_number,
-                    "so:isMeasureOfStaff": staff_ids_for_movement.copy(),
+                    # Same list object for every measure of the movement: it is
+                    # only read from here on (add_unique_id_ref never appends to
+                    # it, since it already holds every staff of the movement)
+                    "so:isMeasureOfStaff": staff_ids_for_movement,
                 }
-                graph.append(measure_node)
                 node_by_id[measure_id] = measure_node
             else:
-                types = measure_node.get("@type", [])
-                if isinstance(types, str):
-                    types = [types]
-                for t in ["mso:Measure", "so:StructuralElement"]:
-                    if t not in types:
-                        types.append(t)
-                measure_node["@type"] = types
-
-                current_staff_refs = measure_node.get("so:isMeasureOfStaff")
+                ensure_types(measure_node, MEASURE_TYPES, type_index)
+
                 for sid_ref in staff_ids_for_movement:
-                    measure_node["so:isMeasureOfStaff"] = append_unique_id_ref(
-                        current_staff_refs, sid_ref["@id"]
-                    )
-                    current_staff_refs = measure_node["so:isMeasureOfStaff"]
+                    add_unique_id_ref(measure_node, "so:isMeasureOfStaff", sid_ref["@id"], seen_refs)
 
             measure_ids_for_movement.append({"@id": measure_id})
 
         # Movement -> Measures
         for mid_ref in measure_ids_for_movement:
-            movement_node["so:movementHasMeasure"] = append_unique_id_ref(
-                movement_node.get("so:movementHasMeasure"), mid_ref["@id"]
-            )
+            add_unique_id_ref(movement_node, "so:movementHasMeasure", mid_ref["@id"], seen_refs)
 
         # Staff -> Measures
         for staff_node in staff_nodes_for_movement:
             for mid_ref in measure_ids_for_movement:
-                staff_node["so:staffHasMeasure"] = append_unique_id_ref(
-                    staff_node.get("so:staffHasMeasure"), mid_ref["@id"]
-                )
+                add_unique_id_ref(staff_node, "so:staffHasMeasure", mid_ref["@id"], seen_refs)
 
         has_movement_list.append({"@id": movement_id})
 
     # Work -> Movements
     for mref in has_movement_list:
-        work_node["so:hasMovement"] = append_unique_id_ref(
-            work_node.get("so:hasMovement"), mref["@id"]
-        )
+        add_unique_id_ref(work_node, "so:hasMovement", mref["@id"], seen_refs)
+
+    jsonld_obj["@graph"] = list(node_by_id.values()) + other_entries
+
+    if not isinstance(pipeline_info, dict):
+        pipeline_info = {}
+        jsonld_obj[PIPELINE_KEY] = pipeline_info
+    pipeline_info["structureSourceHash"] = source_hash
 
-    jsonld_obj["@graph"] = graph
     return jsonld_obj
 
 
@@ -370,7 +513,6 @@ if __name__ == "__main__":
 
     output_jsonld_path = os.path.join(output_dir, work_local_id + ".jsonld")
 
-    with open(output_jsonld_path, "w", encoding="utf-8") as f:
-        json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+    write_jsonld(output_jsonld_path, jsonld_obj)
 
     print(f"JSON-LD written to: {output_jsonld_path}")
@@ -2,8 +2,18 @@ from __future__ import annotations
 import os
 import sys
 import json
-from math import ceil
-from typing import Dict, Any, List, Optional, Set
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from math import inf
+from typing import Dict, Any, FrozenSet, List, Optional, Set, Tuple
+
+# Prefer orjson to (de)serialize the JSON-LD; fall back to the standard library.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 
 JSONLD_DIR = "JSON_LD"
@@ -13,6 +23,18 @@ MSO_PREFIX = "mso:"
 MTO_PREFIX = "mto:"
 HO_PREFIX = "ho:"
 
+# Node classes the complexity profile is computed from
+MEASURE_TYPE = MSO_PREFIX + "Measure"
+SONATA_MOVEMENT_TYPE = SO_PREFIX + "SonataMovement"
+SYMBOLIC_EVENT_TYPE = HO_PREFIX + "SymbolicEvent"
+NOTE_TYPE = MSO_PREFIX + "Note"
+LOUDNESS_DYNAMIC_TYPE = SO_PREFIX + "LoudnessDynamic"
+STACCATO_TYPE = SO_PREFIX + "Staccato"
+
+# Types of the profile nodes written by this script
+LCI_TYPES = ("so:LocalComplexityIndex", "so:TechnicalComplexityProfile")
+GCP_TYPES = ("so:GlobalComplexityProfile", "so:TechnicalComplexityProfile")
+
 
 # ============================
 # Weights for LCI computation
@@ -29,13 +51,42 @@ LOCAL_COMPLEXITY_WEIGHTS = {
 }
 
 
+def _normalize_weights(weights: Dict[str, float]) -> Tuple[float, ...]:
+    """
+    Clamp weights at 0 and scale them to sum to 1 (equal weights if all are 0).
+
+    Returns the weights in metric order: noteCount, measureAccidentalCount,
+    subdivisionIndex, minNoteValue, dynamicCount, articulationCount.
+    """
+    w_sum = sum(max(v, 0.0) for v in weights.values())
+    if w_sum <= 0.0:
+        return (1.0 / 6.0,) * 6
+    return (
+        max(weights["noteCount"],              0.0) / w_sum,
+        max(weights["measureAccidentalCount"], 0.0) / w_sum,
+        max(weights["subdivisionIndex"],       0.0) / w_sum,
+        max(weights["minNoteValue"],           0.0) / w_sum,
+        max(weights["dynamicCount"],           0.0) / w_sum,
+        max(weights["articulationCount"],      0.0) / w_sum,
+    )
+
+
+# Normalized once at import; edit LOCAL_COMPLEXITY_WEIGHTS above, not this
+NORMALIZED_COMPLEXITY_WEIGHTS = _normalize_weights(LOCAL_COMPLEXITY_WEIGHTS)
+
+
 # ---------------------------
 # Helpers
 # ---------------------------
 
+@lru_cache(maxsize=1)
 def get_base_dir() -> str:
     """
     Return the base directory of this script.
+
+    Cached for the lifetime of the process. If __file__ is not defined, the
+    os.getcwd() fallback is resolved at the first call and not re-read
+    after a later chdir.
     """
     try:
         return os.path.dirname(os.path.abspath(__file__))
@@ -43,6 +94,7 @@ def get_base_dir() -> str:
         return os.getcwd()
 
 
+@lru_cache(maxsize=None)
 def xml_to_jsonld_path(xml_path: str) -> str:
     """
     Given a MusicXML path, return the expected JSON-LD path based on the
@@ -50,6 +102,9 @@ def xml_to_jsonld_path(xml_path: str) -> str:
 
     Example:
         Beethoven_Op002No1-01.xml -> JSON_LD/Beethoven_Op002No1-01.jsonld
+
+    Cached per path string; the result only depends on xml_path and
+    get_base_dir().
     """
     base_dir = get_base_dir()
     base_name = os.path.splitext(os.path.basename(xml_path))[0]
@@ -57,9 +112,37 @@ def xml_to_jsonld_path(xml_path: str) -> str:
     return os.path.join(jsonld_dir, base_name + ".jsonld")
 
 
+def read_jsonld(path: str) -> Dict[str, Any]:
+    """
+    Load a JSON-LD document, with orjson when available.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_jsonld(path: str, jsonld_obj: Dict[str, Any]) -> None:
+    """
+    Write a JSON-LD document as UTF-8 JSON indented with 2 spaces.
+
+    Use orjson when installed; fall back to json.dump.
+    """
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(jsonld_obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+
+
 def get_ref_id(value: Any) -> Optional[str]:
     """
     Extract an '@id' from a JSON-LD reference that may be a dict, list or string.
+
+    Hot loops inline the common {"@id": ...} case as
+    `ref.get("@id") if type(ref) is dict else get_ref_id(ref)`.
     """
     if value is None:
         return None
@@ -74,14 +157,29 @@ def get_ref_id(value: Any) -> Optional[str]:
     return None
 
 
-def normalize_types(node: Dict[str, Any]) -> List[str]:
+def ensure_types(node: Dict[str, Any], required: Tuple[str, ...]) -> None:
+    """
+    Make sure node["@type"] is a list containing every type in required,
+    appending missing ones in place (existing order is kept).
+    """
+    types = node.get("@type")
+    if isinstance(types, str):
+        types = node["@type"] = [types]
+    elif types is None:
+        types = node["@type"] = []
+    for t in required:
+        if t not in types:
+            types.append(t)
+
+
+def type_set(node: Dict[str, Any]) -> FrozenSet[str]:
     """
-    Ensure @type is returned as a list of strings.
+    Return the @type values of a node as a frozenset, for repeated membership tests.
     """
-    types = node.get("@type", [])
+    types = node.get("@type", ())
     if isinstance(types, str):
-        return [types]
-    return types
+        return frozenset((types,))
+    return frozenset(types)
 
 
 # Mapping MusicXML note-type -> denominator of the fraction of the whole note.
@@ -102,15 +200,6 @@ NOTE_BASE_DENOMINATORS: Dict[str, int] = {
 }
 
 
-def safe_minmax(values: List[float]) -> (float, float):
-    """
-    Return (min, max) for a list of values, handling empty lists.
-    """
-    if not values:
-        return 0.0, 0.0
-    return min(values), max(values)
-
-
 def safe_normalize(value: float, vmin: float, vmax: float) -> float:
     """
     Min-max normalization to [0, 1]. If vmax == vmin, return 0.0.
@@ -156,38 +245,93 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
         if isinstance(node, dict) and "@id" in node:
             node_by_id[node["@id"]] = node
 
-    # Collect measures and movements
-    measure_ids: Set[str] = set()
-    movement_ids: Set[str] = set()
+    # Collect measures (frozen once the pass is complete)
+    measure_id_set: Set[str] = set()
 
     # Map from event -> measure
     event_measure: Dict[str, str] = {}
 
-    # Notes per measure (event ids)
-    measure_notes: Dict[str, List[str]] = {}
+    # Notes per measure, preresolved to (has_accidental, base_denominator);
+    # base_denominator is 0 when the note has no usable duration / noteType
+    measure_notes: Dict[str, List[Tuple[bool, int]]] = {}
+
+    # Movement -> referenced measure ids, in document order (non-measure
+    # refs are dropped later, when LCI values are looked up)
+    movement_measures: Dict[str, List[str]] = {}
+
+    # Events referenced by loudness dynamics / staccato articulations
+    # (resolved to measures once event_measure is complete)
+    dynamic_event_ids: List[str] = []
+    articulation_event_ids: List[str] = []
 
-    # Build indices from existing nodes
+    # Bound methods used once per node / event below
+    node_by_id_get = node_by_id.get
+    note_base_den_get = NOTE_BASE_DENOMINATORS.get
+    measure_notes_setdefault = measure_notes.setdefault
+
+    # Build all indices in a single pass over the nodes
     for node_id, node in node_by_id.items():
-        types = normalize_types(node)
+        types = type_set(node)
 
         # Identify measures
-        if f"{MSO_PREFIX}Measure" in types:
-            measure_ids.add(node_id)
+        if MEASURE_TYPE in types:
+            measure_id_set.add(node_id)
 
         # Identify sonata movements
-        if f"{SO_PREFIX}SonataMovement" in types:
-            movement_ids.add(node_id)
+        if SONATA_MOVEMENT_TYPE in types:
+            meas_refs = node.get("so:movementHasMeasure")
+            # meas_refs can be dict or list or None
+            if isinstance(meas_refs, dict):
+                meas_refs = [meas_refs]
+            mlist = movement_measures.setdefault(node_id, [])
+            if isinstance(meas_refs, list):
+                for ref in meas_refs:
+                    mid = ref.get("@id") if type(ref) is dict else get_ref_id(ref)
+                    if mid is not None:
+                        mlist.append(mid)
 
         # Symbolic events and their parent measures
-        if f"{HO_PREFIX}SymbolicEvent" in types:
+        if SYMBOLIC_EVENT_TYPE in types:
             measure_ref = node.get("so:isInMeasure")
-            measure_id = get_ref_id(measure_ref)
+            measure_id = measure_ref.get("@id") if type(measure_ref) is dict else get_ref_id(measure_ref)
             if measure_id is not None:
                 event_measure[node_id] = measure_id
 
                 # Note events
-                if f"{MSO_PREFIX}Note" in types:
-                    measure_notes.setdefault(measure_id, []).append(node_id)
+                if NOTE_TYPE in types:
+                    # Pitch / accidental
+                    pitch_ref = node.get("so:hasPitch")
+                    pitch_id = pitch_ref.get("@id") if type(pitch_ref) is dict else get_ref_id(pitch_ref)
+                    pitch_node = node_by_id_get(pitch_id) if pitch_id is not None else None
+                    has_accidental = pitch_node is not None and "so:hasAccidental" in pitch_node
+
+                    # Duration / noteType
+                    base_den = 0
+                    dur_ref = node.get("so:hasDuration")
+                    dur_id = dur_ref.get("@id") if type(dur_ref) is dict else get_ref_id(dur_ref)
+                    dur_node = node_by_id_get(dur_id) if dur_id is not None else None
+                    if dur_node is not None:
+                        note_type_text = dur_node.get("so:noteType")
+                        if isinstance(note_type_text, str):
+                            base_den = note_base_den_get(note_type_text, 0)
+
+                    measure_notes_setdefault(measure_id, []).append((has_accidental, base_den))
+
+        # LoudnessDynamic -> dynamicCount
+        if LOUDNESS_DYNAMIC_TYPE in types:
+            event_ref = node.get("so:isDynamicOf")
+            event_id = event_ref.get("@id") if type(event_ref) is dict else get_ref_id(event_ref)
+            if event_id is not None:
+                dynamic_event_ids.append(event_id)
+
+        # Staccato articulations -> articulationCount
+        if STACCATO_TYPE in types:
+            event_ref = node.get("so:isArticulationOf")
+            event_id = event_ref.get("@id") if type(event_ref) is dict else get_ref_id(event_ref)
+            if event_id is not None:
+                articulation_event_ids.append(event_id)
+
+    measure_ids: FrozenSet[str] = frozenset(measure_id_set)
 
     # Time signature per measure (numerator, denominator)
     measure_timesig: Dict[str, Dict[str, int]] = {}
@@ -218,31 +362,14 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
 
         measure_timesig[measure_id] = {"numerator": num_int, "denominator": den_int}
 
-    # Initialize counts per measure
-    dynamic_count: Dict[str, int] = {mid: 0 for mid in measure_ids}
-    articulation_count: Dict[str, int] = {mid: 0 for mid in measure_ids}
-
-    # Iterate dynamics and articulations
-    for node_id, node in node_by_id.items():
-        types = normalize_types(node)
-
-        # LoudnessDynamic -> dynamicCount
-        if f"{SO_PREFIX}LoudnessDynamic" in types:
-            event_ref = node.get("so:isDynamicOf")
-            event_id = get_ref_id(event_ref)
-            if event_id is not None:
-                measure_id = event_measure.get(event_id)
-                if measure_id in dynamic_count:
-                    dynamic_count[measure_id] += 1
-
-        # Staccato articulations -> articulationCount
-        if f"{SO_PREFIX}Staccato" in types:
-            event_ref = node.get("so:isArticulationOf")
-            event_id = get_ref_id(event_ref)
-            if event_id is not None:
-                measure_id = event_measure.get(event_id)
-                if measure_id in articulation_count:
-                    articulation_count[measure_id] += 1
+    # Resolve dynamics and articulations to their measures; measures without
+    # any read back as 0 from the Counter
+    dynamic_count: Counter = Counter(
+        mid for mid in map(event_measure.get, dynamic_event_ids) if mid in measure_ids
+    )
+    articulation_count: Counter = Counter(
+        mid for mid in map(event_measure.get, articulation_event_ids) if mid in measure_ids
+    )
 
     # Metrics per measure (raw values)
     note_count_by_measure: Dict[str, int] = {}
@@ -250,14 +377,18 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
     subdiv_index_by_measure: Dict[str, int] = {}
     min_note_value_by_measure: Dict[str, int] = {}
 
+    # Min / max of every metric over all measures, for min-max normalization
+    nc_min = acc_min = sub_min = minv_min = dyn_min = art_min = inf
+    nc_max = acc_max = sub_max = minv_max = dyn_max = art_max = -inf
+
     # Compute raw metrics for each measure
     for measure_id in measure_ids:
         ts_info = measure_timesig.get(measure_id, {"numerator": 4, "denominator": 4})
         num_beats = ts_info["numerator"]
         beat_den = ts_info["denominator"]
 
-        note_event_ids = measure_notes.get(measure_id, [])
-        n_notes = len(note_event_ids)
+        note_infos = measure_notes.get(measure_id, [])
+        n_notes = len(note_infos)
 
         # noteCount: total number of notes in the measure
         note_count = n_notes
@@ -265,54 +396,29 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
         # measureAccidentalCount
         accidental_count = 0
 
-        # minNoteValue & subdivisionIndex
-        note_denominators: List[int] = []
-        subdivisions: List[int] = []
-
-        for ev_id in note_event_ids:
-            ev_node = node_by_id.get(ev_id, {})
-
-            # Pitch / accidental
-            pitch_ref = ev_node.get("so:hasPitch")
-            pitch_id = get_ref_id(pitch_ref)
-            if pitch_id is not None and pitch_id in node_by_id:
-                pitch_node = node_by_id[pitch_id]
-                if "so:hasAccidental" in pitch_node:
-                    accidental_count += 1
-
-            # Duration / noteType
-            dur_ref = ev_node.get("so:hasDuration")
-            dur_id = get_ref_id(dur_ref)
-            if dur_id is None or dur_id not in node_by_id:
-                continue
+        # minNoteValue & subdivisionIndex: running maxima (0 when no note has
+        # a usable duration; every actual value is >= 1)
+        min_note_value = 0
+        subdivision_index = 0
 
-            dur_node = node_by_id[dur_id]
-            note_type_text = dur_node.get("so:noteType")
-            if not isinstance(note_type_text, str):
-                continue
+        for has_accidental, base_den in note_infos:
+            if has_accidental:
+                accidental_count += 1
 
-            base_den = NOTE_BASE_DENOMINATORS.get(note_type_text, 0)
             if base_den <= 0:
                 continue
 
-            note_denominators.append(base_den)
+            if base_den > min_note_value:
+                min_note_value = base_den
 
             # Subdivision relative to beat denominator (for rhythmic fineness)
             if beat_den > 0:
-                ratio = base_den / float(beat_den)
-                subdivisions.append(int(ceil(ratio)))
+                # ceil(base_den / beat_den) in integer arithmetic
+                subdivision = -(-base_den // beat_den)
             else:
-                subdivisions.append(base_den)
-
-        if note_denominators:
-            min_note_value = max(note_denominators)
-        else:
-            min_note_value = 0
-
-        if subdivisions:
-            subdivision_index = max(subdivisions)
-        else:
-            subdivision_index = 0
+                subdivision = base_den
+            if subdivision > subdivision_index:
+                subdivision_index = subdivision
 
         # Store raw metrics
         note_count_by_measure[measure_id] = note_count
@@ -320,37 +426,44 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
         subdiv_index_by_measure[measure_id] = subdivision_index
         min_note_value_by_measure[measure_id] = min_note_value
 
+        dyn = dynamic_count[measure_id]
+        art = articulation_count[measure_id]
+
+        if note_count < nc_min:
+            nc_min = note_count
+        if note_count > nc_max:
+            nc_max = note_count
+        if accidental_count < acc_min:
+            acc_min = accidental_count
+        if accidental_count > acc_max:
+            acc_max = accidental_count
+        if subdivision_index < sub_min:
+            sub_min = subdivision_index
+        if subdivision_index > sub_max:
+            sub_max = subdivision_index
+        if min_note_value < minv_min:
+            minv_min = min_note_value
+        if min_note_value > minv_max:
+            minv_max = min_note_value
+        if dyn < dyn_min:
+            dyn_min = dyn
+        if dyn > dyn_max:
+            dyn_max = dyn
+        if art < art_min:
+            art_min = art
+        if art > art_max:
+            art_max = art
+
+    if not measure_ids:
+        nc_min = acc_min = sub_min = minv_min = dyn_min = art_min = 0.0
+        nc_max = acc_max = sub_max = minv_max = dyn_max = art_max = 0.0
+
     # ---------------------------
     # Compute LCIvalue (normalized)
     # ---------------------------
 
-    # Gather raw values for min-max normalization
-    nc_values = list(note_count_by_measure.values())
-    acc_values = list(acc_count_by_measure.values())
-    sub_values = list(subdiv_index_by_measure.values())
-    minv_values = list(min_note_value_by_measure.values())
-    dyn_values = [dynamic_count[m] for m in measure_ids]
-    art_values = [articulation_count[m] for m in measure_ids]
-
-    nc_min, nc_max = safe_minmax(nc_values)
-    acc_min, acc_max = safe_minmax(acc_values)
-    sub_min, sub_max = safe_minmax(sub_values)
-    minv_min, minv_max = safe_minmax(minv_values)
-    dyn_min, dyn_max = safe_minmax(dyn_values)
-    art_min, art_max = safe_minmax(art_values)
-
-    # Normalize weights to sum to 1
-    w = LOCAL_COMPLEXITY_WEIGHTS
-    w_sum = sum(max(v, 0.0) for v in w.values())
-    if w_sum <= 0.0:
-        w_nc = w_acc = w_sub = w_minv = w_dyn = w_art = 1.0 / 6.0
-    else:
-        w_nc  = max(w["noteCount"],              0.0) / w_sum
-        w_acc = max(w["measureAccidentalCount"], 0.0) / w_sum
-        w_sub = max(w["subdivisionIndex"],       0.0) / w_sum
-        w_minv= max(w["minNoteValue"],           0.0) / w_sum
-        w_dyn = max(w["dynamicCount"],           0.0) / w_sum
-        w_art = max(w["articulationCount"],      0.0) / w_sum
+    # Weights normalized to sum to 1 (precomputed at import)
+    w_nc, w_acc, w_sub, w_minv, w_dyn, w_art = NORMALIZED_COMPLEXITY_WEIGHTS
 
     # Map measure -> LCIvalue (needed later for global complexity)
     lci_value_by_measure: Dict[str, float] = {}
@@ -393,21 +506,12 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
         # Reuse existing LCI node if present; otherwise create a new one
         lci_node = node_by_id.get(lci_id)
         if lci_node is None:
-            lci_node = {
-                "@id": lci_id,
-                "@type": [
-                    "so:LocalComplexityIndex",
-                    "so:TechnicalComplexityProfile",
-                ],
-            }
+            lci_node = {"@id": lci_id, "@type": list(LCI_TYPES)}
             graph.append(lci_node)
             node_by_id[lci_id] = lci_node
         else:
             # Ensure the required types are present
-            types = set(normalize_types(lci_node))
-            types.add("so:LocalComplexityIndex")
-            types.add("so:TechnicalComplexityProfile")
-            lci_node["@type"] = list(types)
+            ensure_types(lci_node, LCI_TYPES)
 
         # Clean old noteDensity if it was present (legacy)
         lci_node.pop("so:noteDensity", None)
@@ -428,27 +532,15 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
     # Global complexity per movement
     # ---------------------------
 
-    # Movement -> measures mapping
-    movement_measures: Dict[str, List[str]] = {mid: [] for mid in movement_ids}
-
-    for movement_id in movement_ids:
-        mv_node = node_by_id[movement_id]
-        meas_refs = mv_node.get("so:movementHasMeasure")
-        # meas_refs can be dict or list or None
-        if isinstance(meas_refs, dict):
-            meas_refs = [meas_refs]
-        if isinstance(meas_refs, list):
-            for ref in meas_refs:
-                mid = get_ref_id(ref)
-                if mid in measure_ids:
-                    movement_measures[movement_id].append(mid)
-
     # For each movement, compute globalComplexityIndex as the average LCIvalue
+    # (movement -> measures mapping was built during the indexing pass)
     for movement_id, mlist in movement_measures.items():
         if not mlist:
             # No measures found for this movement; skip GCP creation
             continue
 
+        # Only measures carry an LCI value, so this also filters out refs
+        # that do not point to a measure node
         lci_values: List[float] = []
         for mid in mlist:
             val = lci_value_by_measure.get(mid)
@@ -467,20 +559,11 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
 
         gcp_node = node_by_id.get(gcp_id)
         if gcp_node is None:
-            gcp_node = {
-                "@id": gcp_id,
-                "@type": [
-                    "so:GlobalComplexityProfile",
-                    "so:TechnicalComplexityProfile",
-                ],
-            }
+            gcp_node = {"@id": gcp_id, "@type": list(GCP_TYPES)}
             graph.append(gcp_node)
             node_by_id[gcp_id] = gcp_node
         else:
-            types = set(normalize_types(gcp_node))
-            types.add("so:GlobalComplexityProfile")
-            types.add("so:TechnicalComplexityProfile")
-            gcp_node["@type"] = list(types)
+            ensure_types(gcp_node, GCP_TYPES)
 
         gcp_node["so:globalComplexityIndex"] = round(gci, 4)
 
@@ -496,23 +579,61 @@ def compute_technical_complexity_profiles(jsonld_obj: Dict[str, Any]) -> Dict[st
 # File processing helper
 # ---------------------------
 
-def process_jsonld_file(jsonld_path: str) -> None:
+def process_jsonld_file(jsonld_path: str) -> str:
     """
     Load a JSON-LD file, compute technical complexity profiles,
     and overwrite the file with the updated content.
+
+    Returns the path of the written JSON-LD file.
     """
     if not os.path.isfile(jsonld_path):
         raise FileNotFoundError(f"JSON-LD file not found: {jsonld_path}")
 
-    with open(jsonld_path, "r", encoding="utf-8") as f:
-        jsonld_obj = json.load(f)
+    jsonld_obj = read_jsonld(jsonld_path)
 
     jsonld_obj = compute_technical_complexity_profiles(jsonld_obj)
 
-    with open(jsonld_path, "w", encoding="utf-8") as f:
-        json.dump(jsonld_obj, f, indent=2, ensure_ascii=False)
+    write_jsonld(jsonld_path, jsonld_obj)
 
     print(f"[OK] Technical complexity profiles written into: {jsonld_path}")
+    return jsonld_path
+
+
+def process_jsonld_folder(jsonld_dir: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Run process_jsonld_file on every .jsonld file found in jsonld_dir.
+
+    Files are independent, so they are distributed over a pool of worker
+    processes (max_workers defaults to the number of CPUs). A failing file is
+    reported and skipped; the names of the failed files are returned.
+    """
+    with os.scandir(jsonld_dir) as it:
+        files = sorted(
+            e.name for e in it
+            if e.is_file() and e.name.lower().endswith(".jsonld")
+        )
+    if not files:
+        print(f"No .jsonld files found in {jsonld_dir}")
+        return []
+
+    print(f"Processing {len(files)} JSON-LD files in {jsonld_dir} ...")
+    failed: List[str] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_jsonld_file, os.path.join(jsonld_dir, fname)): fname
+            for fname in files
+        }
+        for future in as_completed(futures):
+            fname = futures[future]
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"[ERROR] Technical complexity step failed for {fname}: {exc}")
+                failed.append(fname)
+
+    if failed:
+        print(f"[ERROR] {len(failed)} of {len(files)} JSON-LD files failed")
+    return sorted(failed)
 
 
 # ---------------------------
@@ -544,37 +665,16 @@ if __name__ == "__main__":
         if not os.path.isdir(jsonld_dir):
             raise FileNotFoundError(f"JSON-LD directory not found: {jsonld_dir}")
 
-        files = sorted(
-            f for f in os.listdir(jsonld_dir)
-            if f.lower().endswith(".jsonld")
-        )
-        if not files:
-            print(f"No .jsonld files found in {jsonld_dir}")
-            sys.exit(0)
-
-        print(f"Processing {len(files)} JSON-LD files in {jsonld_dir} ...")
-        for fname in files:
-            path = os.path.join(jsonld_dir, fname)
-            process_jsonld_file(path)
+        if process_jsonld_folder(jsonld_dir):
+            sys.exit(1)
 
     elif len(sys.argv) == 2:
         arg = sys.argv[1]
 
         # Case: directory -> process all .jsonld inside
         if os.path.isdir(arg):
-            jsonld_dir = arg
-            files = sorted(
-                f for f in os.listdir(jsonld_dir)
-                if f.lower().endswith(".jsonld")
-            )
-            if not files:
-                print(f"No .jsonld files found in directory {jsonld_dir}")
-                sys.exit(0)
-
-            print(f"Processing {len(files)} JSON-LD files in {jsonld_dir} ...")
-            for fname in files:
-                path = os.path.join(jsonld_dir, fname)
-                process_jsonld_file(path)
+            if process_jsonld_folder(arg):
+                sys.exit(1)
 
         # Case: file
         elif os.path.isfile(arg):
@@ -1,7 +1,8 @@
 from __future__ import annotations
 import os
 import sys
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
 
 from rdflib import Graph
 
@@ -50,17 +51,29 @@ def jsonld_to_ttl(input_path: str, output_path: str) -> str:
     return output_path
 
 
-def batch_convert_jsonld_to_ttl(jsonld_folder: str, ttl_folder: str) -> None:
+def batch_convert_jsonld_to_ttl(
+    jsonld_folder: str, ttl_folder: str, max_workers: Optional[int] = None
+) -> List[str]:
     """
     Convert all .jsonld files found in jsonld_folder to .ttl,
     writing each Turtle file into ttl_folder (same base filename).
 
+    Conversions are independent and CPU-bound (rdflib is pure Python), so they
+    run in a pool of worker processes. A failing file is reported and skipped.
+
     Parameters
     ----------
     jsonld_folder : str
         Folder where JSON-LD files are located.
     ttl_folder : str
         Folder where Turtle files will be written.
+    max_workers : int, optional
+        Number of worker processes (defaults to the number of CPUs).
+
+    Returns
+    -------
+    list of str
+        Names of the JSON-LD files that failed to convert (empty on success).
     """
     if not os.path.isdir(jsonld_folder):
         raise NotADirectoryError(f"JSON-LD folder not found: {jsonld_folder}")
@@ -68,25 +81,43 @@ def batch_convert_jsonld_to_ttl(jsonld_folder: str, ttl_folder: str) -> None:
     # Ensure TTL folder exists
     os.makedirs(ttl_folder, exist_ok=True)
 
-    files = sorted(
-        f for f in os.listdir(jsonld_folder) if f.lower().endswith(".jsonld")
-    )
+    with os.scandir(jsonld_folder) as it:
+        files = sorted(
+            e.name for e in it
+            if e.is_file() and e.name.lower().endswith(".jsonld")
+        )
 
     if not files:
         print(f"No .jsonld files found in folder: {jsonld_folder}")
-        return
+        return []
 
     print(f"Found {len(files)} JSON-LD files in: {jsonld_folder}")
-    for fname in files:
-        in_path = os.path.join(jsonld_folder, fname)
-
-        base_name, _ = os.path.splitext(fname)
-        out_fname = base_name + ".ttl"
-        out_path = os.path.join(ttl_folder, out_fname)
-
-        print(f"Converting: {fname} -> {out_fname}")
-        ttl_path = jsonld_to_ttl(in_path, out_path)
-        print(f"  OK: {ttl_path}")
+    failed: List[str] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for fname in files:
+            in_path = os.path.join(jsonld_folder, fname)
+
+            base_name, _ = os.path.splitext(fname)
+            out_fname = base_name + ".ttl"
+            out_path = os.path.join(ttl_folder, out_fname)
+
+            print(f"Converting: {fname} -> {out_fname}")
+            futures[executor.submit(jsonld_to_ttl, in_path, out_path)] = fname
+
+        for future in as_completed(futures):
+            fname = futures[future]
+            try:
+                ttl_path = future.result()
+            except Exception as exc:
+                print(f"  [ERROR] {fname}: {exc}")
+                failed.append(fname)
+                continue
+            print(f"  OK: {ttl_path}")
+
+    if failed:
+        print(f"[ERROR] {len(failed)} of {len(files)} JSON-LD files failed to convert")
+    return sorted(failed)
 
 
 if __name__ == "__main__":
@@ -110,4 +141,5 @@ if __name__ == "__main__":
     else:
         sys.exit(1)
 
-    batch_convert_jsonld_to_ttl(jsonld_dir, ttl_dir)
+    if batch_convert_jsonld_to_ttl(jsonld_dir, ttl_dir):
+        sys.exit(1)